@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,6 +31,8 @@ ALLOWED_HOSTS = []
 
 AUTH_USER_MODEL = 'twotails.User'
 
+AUTHENTICATION_BACKENDS = ['twotails.backends.TwotailsBackend']
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -42,11 +46,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы время запроса включало остальные middleware.
+    "twotails.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "twotails.routers.ReplicaStickinessMiddleware",
+    "twotails.guest_cart.GuestCartMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -84,6 +92,92 @@ DATABASES = { 'default':
                 'PORT': '5432', } 
              }
 
+# Пул соединений psycopg (нужен пакет psycopg-pool): и синхронные запросы,
+# и async ORM берут готовое соединение вместо нового подключения к PostgreSQL.
+if importlib.util.find_spec("psycopg_pool"):
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {"min_size": 2, "max_size": int(os.environ.get("DB_POOL_SIZE", 20)), "timeout": 10},
+    }
+
+# Реплики только для чтения: каталог и отчёты читаются с них (twotails/routers.py).
+# Для локальной проверки репликой может служить копия основной базы:
+#   CREATE DATABASE twotails_replica TEMPLATE twotails;
+#   REPLICA_DB_NAMES=twotails_replica python manage.py runserver
+REPLICA_DATABASES = []
+for index, name in enumerate(filter(None, os.environ.get('REPLICA_DB_NAMES', '').split(','))):
+    alias = f'replica{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': name, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['twotails.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+REPLICA_MAX_LAG_SECONDS = 10
+REPLICA_CHECK_INTERVAL = 5
+
+# Кэш: L1 в памяти процесса (LRU, не больше MAX_ENTRIES ключей) перед общим L2.
+# L2 — Redis, если задан REDIS_URL, иначе файловый кэш (для разработки и тестов).
+CACHES = {
+    "default": {
+        "BACKEND": "twotails.cache.TieredCache",
+        "OPTIONS": {"LOCAL": "local", "SHARED": "shared", "LOCAL_TIMEOUT": 5},
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "twotails-l1",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    "shared": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.environ["REDIS_URL"]}
+        if os.environ.get("REDIS_URL") else
+        # FileBasedCache на каждый set() перечисляет весь каталог (_cull), поэтому
+        # предел держим небольшим. Вытесненный ключ версии безопасен: get_versions
+        # заводит его заново со свежей отметкой времени.
+        {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+         "LOCATION": os.environ.get("CACHE_DIR", BASE_DIR / ".cache"),
+         "OPTIONS": {"MAX_ENTRIES": 5000}}
+    ),
+}
+
+# Токен для /metrics (Authorization: Bearer ...); без токена метрики доступны только при DEBUG.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Токен для ленты изменений /api/changes/ (Authorization: Bearer ...); без токена
+# ленту читает только персонал.
+CHANGES_TOKEN = os.environ.get("CHANGES_TOKEN", "")
+
+# Журнал медленных запросов (twotails/slow_queries.py): порог в мс (0 — выключено),
+# доля запросов, для которых снимается EXPLAIN ANALYZE, его таймаут и сколько
+# последних записей хранить. Параметры запросов сохраняются только с
+# SLOW_QUERY_STORE_PARAMS, а видны в админке с правом view_query_details.
+SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 500))
+SLOW_QUERY_STORE_PARAMS = False
+SLOW_QUERY_EXPLAIN_RATE = 0.1
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = 30000
+SLOW_QUERY_KEEP = 10000
+
+# Границы ценовых диапазонов фасетов каталога и срок кэширования счётчиков.
+FACET_PRICE_EDGES = [500, 1000, 2000, 5000]
+FACET_CACHE_TIMEOUT = 300
+
+# Срок жизни фрагментов стартовых данных /api/bootstrap/.
+BOOTSTRAP_CACHE_TIMEOUT = 300
+
+# Прогноз спроса и черновики поставок (twotails/forecasting.py): история продаж,
+# окно скользящего среднего, коэффициент сглаживания; срок поставки, страховой
+# запас и на сколько дней заказывать (не больше срока годности товара).
+FORECAST_HISTORY_DAYS = 90
+FORECAST_WINDOW_DAYS = 14
+FORECAST_SMOOTHING = 0.3
+REORDER_LEAD_DAYS = 7
+REORDER_SAFETY_DAYS = 7
+REORDER_COVER_DAYS = 30
+
+# Куда `manage.py export_sales` пишет Parquet-файлы с фактами продаж.
+SALES_EXPORT_DIR = Path(os.environ.get("SALES_EXPORT_DIR", BASE_DIR / "exports" / "sales"))
+
+# Сколько секунд товар из активной корзины остаётся зарезервированным.
+CART_RESERVATION_TTL = 15 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -120,3 +214,13 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = "static/"
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# Сборка Vite (npm run build в frontend/) собирается collectstatic вместе со статикой Django.
+FRONTEND_DIST = BASE_DIR.parent / "frontend" / "dist"
+STATICFILES_DIRS = [FRONTEND_DIST] if FRONTEND_DIST.is_dir() else []
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "twotails.storage.CompressedManifestStaticFilesStorage"},
+}
@@ -15,9 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path, re_path
+
+from twotails.views import metrics, static_asset
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/", include("twotails.urls")),
+    path("metrics", metrics, name="metrics"),
+    # В DEBUG runserver отдаёт статику из исходников сам, до этого маршрута.
+    re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.+)$", static_asset),
 ]
@@ -1,10 +1,24 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.html import format_html
 
 # Register your models here.
 
 from django.contrib.auth.admin import UserAdmin
+from .deliveries import transition as delivery_transition
+from .orders import transition as order_transition
+from .permissions import get_scope
+from .promotions import assign, products_for
+from .repricing import (RULE_CHOICES, InvalidRepricing, apply as apply_prices, preview as preview_prices,
+                        validate as validate_repricing)
+from .supplies import post_drafts
 from .models import (User, Role, Address, Supplier, Supply, SupplyItem, Delivery ,Category, Product,
-                      DeliveryItem, Cart, CartItem, Order, OrderItem, Promotion, ProductPromotion)
+                      DeliveryItem, Cart, CartItem, Order, OrderItem, Promotion, ProductPromotion,
+                      ArchivedOrder, Job, DeliveryStatusLog, PriceHistory, SlowQuery)
 
 
 class AddressInline(admin.StackedInline):
@@ -25,9 +39,50 @@ class CategoryInline(admin.TabularInline):
 class ProductPromotionInline(admin.TabularInline):
     model = ProductPromotion
     extra = 1
-class DeliveryItemInline(admin.TabularInline):
+class SupplierProductsInline(admin.TabularInline):
+    # Поставщик выбирает товар только из своих: чужие не попадают ни в список,
+    # ни в допустимые значения формы.
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        scope = get_scope(request)
+        if db_field.name == 'product' and scope.is_supplier:
+            kwargs['queryset'] = Product.objects.filter(supplier=scope.supplier_id)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+class DeliveryItemInline(SupplierProductsInline):
     model = DeliveryItem
     extra = 1
+
+    def _supplier_can_edit(self, request):
+        scope = get_scope(request)
+        return scope.is_supplier and scope.has('can_edit_delivery_items')
+
+    def has_view_permission(self, request, obj=None):
+        return self._supplier_can_edit(request) or super().has_view_permission(request, obj)
+
+    def has_add_permission(self, request, obj=None):
+        return self._supplier_can_edit(request) or super().has_add_permission(request, obj)
+
+    def has_change_permission(self, request, obj=None):
+        return self._supplier_can_edit(request) or super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return self._supplier_can_edit(request) or super().has_delete_permission(request, obj)
+class DeliveryStatusLogInline(admin.TabularInline):
+    model = DeliveryStatusLog
+    extra = 0
+    can_delete = False
+    readonly_fields = ['from_status', 'to_status', 'changed_at', 'changed_by']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+class PriceHistoryInline(admin.TabularInline):
+    model = PriceHistory
+    extra = 0
+    can_delete = False
+    readonly_fields = ['valid_from', 'purchase_price', 'sale_price', 'discount_percent']
+    ordering = ['-valid_from']
+
+    def has_add_permission(self, request, obj=None):
+        return False
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 1
@@ -37,12 +92,32 @@ class OrderItemInline(admin.TabularInline):
 class ProductPromotionInline(admin.TabularInline):
     model = ProductPromotion
     extra = 1
-class SupplyItemInline(admin.TabularInline):
+class SupplyItemInline(SupplierProductsInline):
     model = SupplyItem
     extra = 1 
 
 
 
+class SupplierScopedAdmin(admin.ModelAdmin):
+    # Пользователь, привязанный к поставщику, видит только его объекты:
+    # фильтр добавляется в SQL, а права берутся из кэша запроса (get_scope).
+    supplier_lookup = 'supplier'
+    own_view_permission = None
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        scope = get_scope(request)
+        if scope.is_supplier:
+            queryset = queryset.filter(**{self.supplier_lookup: scope.supplier_id})
+        return queryset
+
+    def has_view_permission(self, request, obj=None):
+        scope = get_scope(request)
+        if scope.is_supplier and scope.has(self.own_view_permission):
+            return True
+        return super().has_view_permission(request, obj)
+
+
 @admin.register(Role)
 class RoleAdmin(admin.ModelAdmin):
     model = Role
@@ -77,6 +152,10 @@ class UserAdmin(UserAdmin):
         'last_name',
     ]
     date_hierarchy = 'date_joined'
+    fieldsets = UserAdmin.fieldsets + (
+        ('Роль', {'fields': ('role', 'supplier')}),
+    )
+    list_select_related = ['role']
 
     inlines = [AddressInline, CartInline, OrderInline]
 
@@ -90,21 +169,89 @@ class SupplierAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 @admin.register(Supply)
-class SupplyAdmin(admin.ModelAdmin):
-    list_display = ['id', 'supplier', 'date']
-    list_filter = ['supplier', 'date']
+class SupplyAdmin(SupplierScopedAdmin):
+    list_display = ['id', 'supplier', 'date', 'is_draft']
+    list_filter = ['is_draft', 'supplier', 'date']
     inlines = [SupplyItemInline]
     search_fields = ['supplier__name']
     date_hierarchy = 'date'
+    own_view_permission = 'view_own_deliveries'
+    # Черновик проводится только действием: оно и оприходует товар.
+    readonly_fields = ['is_draft']
+    actions = ['post_drafts']
+
+    @admin.action(description="Провести черновики", permissions=['change'])
+    def post_drafts(self, request, queryset):
+        posted = post_drafts(queryset)
+        self.message_user(request, f"Проведено поставок: {len(posted)}")
+
+def transition_action(target, description, permission):
+    def action(modeladmin, request, queryset):
+        moved = delivery_transition(queryset, target, user=request.user)
+        modeladmin.message_user(request, f"Переведено доставок: {len(moved)}")
+    action.__name__ = f'mark_{target}'
+    return admin.action(description=description, permissions=[permission])(action)
+
 
 @admin.register(Delivery)
-class DeliveryAdmin(admin.ModelAdmin):
+class DeliveryAdmin(SupplierScopedAdmin):
     model = Delivery
-    list_display = ['status', 'delivery_date', 'supplier_id']
+    list_display = ['status', 'status_changed_at', 'delivery_date', 'supplier_id']
+    list_filter = ['status']
     search_fields = ['supplier_id']
+    inlines = [DeliveryItemInline, DeliveryStatusLogInline]
+    own_view_permission = 'view_own_deliveries'
+    actions = [
+        transition_action('confirmed', "Подтвердить", 'confirm'),
+        transition_action('rejected', "Отклонить", 'confirm'),
+        transition_action('assembling', "Начать сборку", 'status'),
+        transition_action('in_progress', "Отправить", 'status'),
+        transition_action('received', "Принять и оприходовать", 'status'),
+        transition_action('canceled', "Отменить", 'cancel'),
+    ]
+
+    def _can(self, request, codename):
+        user = request.user
+        return user.has_perm(f'twotails.{codename}') or user.has_perm('twotails.change_delivery')
+
+    def has_confirm_permission(self, request):
+        return self._can(request, 'confirm_supply')
+
+    def has_cancel_permission(self, request):
+        return self._can(request, 'cancel_supply')
+
+    def has_status_permission(self, request):
+        return self._can(request, 'change_order_item_status')
+
+    def has_change_permission(self, request, obj=None):
+        scope = get_scope(request)
+        if scope.is_supplier and scope.has('can_edit_delivery_items'):
+            return True
+        return super().has_change_permission(request, obj)
+
+    def get_readonly_fields(self, request, obj=None):
+        # Статус меняется только действиями списка (twotails/deliveries.py).
+        if get_scope(request).is_supplier:
+            return ['status', 'status_changed_at', 'supplier']
+        return ['status', 'status_changed_at']
+
+class RepriceForm(ActionForm):
+    rule = forms.ChoiceField(choices=RULE_CHOICES, required=False, label="Правило")
+    value = forms.DecimalField(required=False, label="Значение")
+    confirm = forms.BooleanField(required=False, label="Применить (иначе только предпросмотр)")
+
+    def clean(self):
+        data = super().clean()
+        if data.get('rule') and data.get('value') is not None:
+            try:
+                validate_repricing(data['rule'], data['value'])
+            except InvalidRepricing as error:
+                raise forms.ValidationError(str(error))
+        return data
+
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(SupplierScopedAdmin):
     list_display = (
         'name',
         'category',
@@ -119,9 +266,12 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('category', 'manufacturer', 'supplier', 'promotions')
     search_fields = ('name', 'description', 'manufacturer')
     readonly_fields = ('profit',)
-    inlines = [ProductPromotionInline]
+    inlines = [ProductPromotionInline, PriceHistoryInline]
     ordering = ('name',)
     list_per_page = 25
+    own_view_permission = 'view_own_products'
+    action_form = RepriceForm
+    actions = ['reprice']
 
     fieldsets = (
         ('Основная информация', {
@@ -141,6 +291,41 @@ class ProductAdmin(admin.ModelAdmin):
         return ", ".join([p.name for p in obj.promotions.all()])
     promotions_list.short_description = 'Акции'
 
+    @admin.action(description="Пересчитать цены продажи", permissions=['change'])
+    def reprice(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid():
+            errors = '; '.join(error for errors in form.errors.values() for error in errors)
+            self.message_user(request, errors, level=messages.ERROR)
+            return
+        data = form.cleaned_data
+        if not data['rule'] or data['value'] is None:
+            self.message_user(request, "Выберите правило и значение", level=messages.WARNING)
+            return
+        summary = preview_prices(queryset, data['rule'], data['value'])
+        if not summary['changed']:
+            self.message_user(request, "Цены не изменятся", level=messages.WARNING)
+            return
+        if summary['zeroed']:
+            self.message_user(request, f"Правило обнулит цену товаров: {summary['zeroed']}", level=messages.ERROR)
+            return
+        text = (
+            f"товаров: {summary['changed']} из {summary['total']}, "
+            f"сумма цен {summary['old_sum']} → {summary['new_sum']}, "
+            f"изменение от {summary['min_delta']} до {summary['max_delta']}"
+        )
+        if not data['confirm']:
+            self.message_user(request, f"Предпросмотр — {text}. Отметьте «Применить», чтобы сохранить.",
+                              level=messages.INFO)
+            return
+        try:
+            changed = apply_prices(queryset, data['rule'], data['value'])
+        except InvalidRepricing as error:
+            self.message_user(request, str(error), level=messages.ERROR)
+            return
+        self.message_user(request, f"Цены пересчитаны: {len(changed)} ({text})")
+
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'created_at', 'updated_at', 'total_items')
@@ -152,11 +337,54 @@ class CartAdmin(admin.ModelAdmin):
         return sum(item.quantity for item in obj.cartitem_set.all())
     total_items.short_description = "Всего товаров"
 
+@admin.register(OrderItem)
+class OrderItemAdmin(SupplierScopedAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'price_at_purchase', 'order_created_at')
+    list_select_related = ('order', 'product')
+    search_fields = ('product__name',)
+    date_hierarchy = 'order_created_at'
+    supplier_lookup = 'product__supplier'
+    own_view_permission = 'view_own_orders'
+
+def order_transition_action(target, description):
+    def action(modeladmin, request, queryset):
+        moved = order_transition(queryset, target)
+        modeladmin.message_user(request, f"Переведено заказов: {len(moved)}")
+    action.__name__ = f'mark_{target}'
+    return admin.action(description=description, permissions=['change'])(action)
+
+
+@admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'created_at', 'total_amount', 'items_count')
     list_filter = ('status',)
+    list_select_related = ('user',)
     search_fields = ('user__username',)
+    date_hierarchy = 'created_at'
     inlines = [OrderItemInline]
+    actions = [
+        order_transition_action('paid', "Отметить оплаченными"),
+        order_transition_action('shipped', "Отметить отправленными"),
+        order_transition_action('cancelled', "Отменить и вернуть товары на склад"),
+    ]
+
+    def get_queryset(self, request):
+        # Коррелированный подзапрос считается только для строк текущей страницы.
+        items = (OrderItem.objects.filter(order=OuterRef('pk'))
+                 .values('order').annotate(count=Count('pk')).values('count'))
+        return super().get_queryset(request).annotate(
+            items_count=Coalesce(Subquery(items), 0),
+        )
+
+    @admin.display(description="Товаров", ordering='items_count')
+    def items_count(self, obj):
+        return obj.items_count
+
+class AssignProductsForm(ActionForm):
+    category = forms.ModelChoiceField(Category.objects.all(), required=False, label="Категория")
+    supplier = forms.ModelChoiceField(Supplier.objects.all(), required=False, label="Поставщик")
+    manufacturer = forms.CharField(required=False, label="Производитель")
+
 
 @admin.register(Promotion)
 class PromotionAdmin(admin.ModelAdmin):
@@ -164,7 +392,85 @@ class PromotionAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'start_date', 'end_date')
     search_fields = ('name', 'description')
     inlines = [ProductPromotionInline]
+    action_form = AssignProductsForm
+    actions = ['assign_products']
+
+    @admin.action(description="Добавить товары категории / поставщика / производителя", permissions=['change'])
+    def assign_products(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or not any(form.cleaned_data.get(field) for field in ('category', 'supplier', 'manufacturer')):
+            self.message_user(request, "Выберите категорию, поставщика или производителя", level=messages.WARNING)
+            return
+        data = form.cleaned_data
+        products = products_for(data['category'], data['supplier'], data['manufacturer'].strip())
+        added = assign(queryset.values_list('pk', flat=True), products)
+        self.message_user(request, f"Товаров добавлено в акции: {len(added)}")
 
     def active_status(self, obj):
         return "Активна" if obj.is_active else "Неактивна"
-    active_status.short_description = "Статус"
\ No newline at end of file
+    active_status.short_description = "Статус"
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created_at', 'total_amount', 'archived_at')
+    list_filter = ('status',)
+    search_fields = ('user__username',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'priority', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'priority', 'name')
+    readonly_fields = ('attempts', 'locked_at', 'finished_at', 'last_error', 'created_at')
+    actions = ['requeue']
+
+    @admin.action(description="Поставить в очередь повторно")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_at=timezone.now(), locked_at=None,
+        )
+        self.message_user(request, f"В очередь поставлено задач: {updated}")
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'duration_ms', 'view', 'origin', 'short_sql', 'has_plan')
+    list_filter = ('alias', 'origin')
+    search_fields = ('sql', 'view', 'origin')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    fields = ('created_at', 'duration_ms', 'alias', 'view', 'origin', 'sql', 'params', 'stack', 'plan_pre')
+    readonly_fields = fields
+    # В параметрах и в плане (литералы в условиях) могут быть персональные данные.
+    detail_fields = ('params', 'plan_pre')
+
+    def get_fields(self, request, obj=None):
+        if request.user.has_perm('twotails.view_query_details'):
+            return self.fields
+        return [field for field in self.fields if field not in self.detail_fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def short_sql(self, obj):
+        return obj.sql[:120]
+    short_sql.short_description = "SQL"
+
+    @admin.display(boolean=True, description="План")
+    def has_plan(self, obj):
+        return bool(obj.plan)
+
+    @admin.display(description="План EXPLAIN ANALYZE")
+    def plan_pre(self, obj):
+        return format_html('<pre>{}</pre>', obj.plan) if obj.plan else "—"
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TwotailsConfig(AppConfig):
     name = "twotails"
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
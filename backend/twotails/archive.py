@@ -0,0 +1,84 @@
+from datetime import timedelta
+from heapq import merge
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem
+
+CLOSED_STATUSES = ('shipped', 'cancelled')
+
+
+def archive_closed_orders(retention_days, batch_size=1000):
+    """Переносит закрытые заказы старше срока хранения в архив пачками."""
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            orders = list(
+                Order.objects
+                .select_for_update(skip_locked=True)
+                .filter(status__in=CLOSED_STATUSES, created_at__lt=cutoff)
+                .order_by('created_at')[:batch_size]
+            )
+            if not orders:
+                return archived
+            ids = [order.id for order in orders]
+            # Условие по order_created_at отсекает лишние секции (см. partitioning.py).
+            items = OrderItem.objects.filter(order_id__in=ids, order_created_at__lt=cutoff)
+            by_order = {}
+            for order_id, product_id, quantity, price in items.values_list(
+                'order_id', 'product_id', 'quantity', 'price_at_purchase'
+            ):
+                by_order.setdefault(order_id, []).append([product_id, quantity, price])
+
+            ArchivedOrder.objects.bulk_create(
+                [
+                    ArchivedOrder(
+                        id=order.id,
+                        user_id=order.user_id,
+                        created_at=order.created_at,
+                        status=order.status,
+                        total_amount=order.total_amount,
+                        items=by_order.get(order.id, []),
+                    )
+                    for order in orders
+                ],
+                ignore_conflicts=True,
+            )
+            items.delete()
+            Order.objects.filter(pk__in=ids).delete()
+            archived += len(orders)
+
+
+def delete_orphaned_items(retention_days, batch_size=5000):
+    """Удаляет элементы заказов, оставшиеся без заказа, старше срока хранения."""
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    orphans = OrderItem.objects.filter(order__isnull=True, order_created_at__lt=cutoff)
+    deleted = 0
+    while True:
+        ids = list(orphans.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += orphans.filter(pk__in=ids).delete()[0]
+
+
+def order_history(user):
+    """История заказов покупателя: рабочие и архивные заказы, от новых к старым."""
+    recent = Order.objects.filter(user=user).prefetch_related('orderitem_set').order_by('-created_at')
+    archived = ArchivedOrder.objects.filter(user=user).order_by('-created_at')
+    return list(merge(recent, archived, key=lambda order: order.created_at, reverse=True))
+
+
+def get_order(order_id, user=None):
+    lookup = {'pk': order_id} if user is None else {'pk': order_id, 'user': user}
+    try:
+        return Order.objects.get(**lookup)
+    except Order.DoesNotExist:
+        return ArchivedOrder.objects.get(**lookup)
+
+
+def order_items(order):
+    if isinstance(order, ArchivedOrder):
+        return order.item_objects()
+    return list(order.orderitem_set.all())
@@ -0,0 +1,14 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth import get_user_model
+
+
+class TwotailsBackend(ModelBackend):
+    # Роль и поставщик нужны почти на каждой странице админки —
+    # загружаем их вместе с пользователем одним запросом.
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('role', 'supplier').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
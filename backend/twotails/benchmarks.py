@@ -0,0 +1,661 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, connections
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import get_or_compute
+from .categories import recount_all, subtree_ids
+from .facets import compute_facets, price_edges
+from .jobs import task, work
+from .models import (
+    Cart, CartItem, Category, Job, Order, OrderItem, PriceHistory, Product, ProductNeighbour,
+    ProductPromotion, Promotion, Role, StockReservation, Supplier, SupplyItem, User,
+)
+from .orders import transition as order_transition
+from .promotions import active_on, assign, products_for
+from .reservations import InsufficientStock
+from .storage import COMPRESSIBLE, encoded_variants
+from .partitioning import add_months, ensure_partitions, is_partitioned, month_start
+
+# Сценарии для `manage.py benchmark <name>`. Каждый сценарий получает
+# stdout команды и размер набора данных; по умолчанию выполняется
+# в транзакции, которая откатывается после замеров.
+SCENARIOS = {}
+
+
+def scenario(name, default_size=1000, rollback=True):
+    def decorator(func):
+        func.default_size = default_size
+        func.rollback = rollback
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+@contextmanager
+def timed(stdout, label):
+    started = time.perf_counter()
+    yield
+    stdout.write(f'{label}: {(time.perf_counter() - started) * 1000:.1f} мс')
+
+
+def explain(queryset, analyze=True):
+    sql, params = queryset.query.sql_with_params()
+    options = '(ANALYZE, COSTS OFF, TIMING OFF, SUMMARY OFF)' if analyze else '(COSTS OFF)'
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN {options} {sql}', params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def analyze(*models):
+    # Свежесгенерированные данные ещё не попали в статистику планировщика.
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+
+def seed_catalogue(products, categories=20, suppliers=10):
+    supplier_objs = Supplier.objects.bulk_create(
+        Supplier(name=f'Поставщик {i}', email=f'bench-{i}-{random.random()}@example.com')
+        for i in range(suppliers)
+    )
+    roots = Category.objects.bulk_create(
+        Category(name=f'Раздел {i}') for i in range(max(categories // 4, 1))
+    )
+    children = Category.objects.bulk_create(
+        Category(name=f'Категория {i}', parent=random.choice(roots))
+        for i in range(categories - len(roots))
+    )
+    category_objs = roots + children
+    manufacturers = [f'Производитель {i}' for i in range(15)]
+    products = Product.objects.bulk_create(
+        Product(
+            name=f'Товар {i}',
+            description='',
+            purchase_price=price,
+            sale_price=price + random.randint(10, 500),
+            current_quantity=random.randint(0, 500),
+            manufacturer=random.choice(manufacturers),
+            supplier=random.choice(supplier_objs),
+            category=random.choice(category_objs),
+        )
+        for i in range(products)
+        for price in [random.randint(50, 5000)]
+    )
+    # bulk_create минует сигналы, которые ведут счётчики товаров в категориях.
+    recount_all()
+    return products
+
+
+def seed_orders(orders, products, months=24, items_per_order=3, statuses=None):
+    statuses = statuses or [code for code, _ in Order.STATUS_CHOICES]
+    now = timezone.now()
+    order_objs = Order.objects.bulk_create(
+        Order(
+            status=random.choice(statuses),
+            total_amount=0,
+            created_at=now - timedelta(days=random.uniform(0, months * 30)),
+        )
+        for _ in range(orders)
+    )
+    OrderItem.objects.bulk_create(
+        (
+            OrderItem(
+                order=order,
+                order_created_at=order.created_at,
+                product=product,
+                quantity=random.randint(1, 5),
+                price_at_purchase=product.sale_price,
+            )
+            for order in order_objs
+            for product in random.sample(products, min(items_per_order, len(products)))
+        ),
+        batch_size=5000,
+    )
+    return order_objs
+
+
+@scenario('partition_pruning', default_size=20000)
+def partition_pruning(stdout, size):
+    if not is_partitioned('twotails_order'):
+        stdout.write('Таблица заказов не секционирована, сценарий пропущен')
+        return
+    this_month = month_start(timezone.now().date())
+    with connection.cursor() as cursor:
+        ensure_partitions(add_months(this_month, -24), this_month, cursor)
+    seed_orders(size, seed_catalogue(200), months=24)
+    analyze(Order, OrderItem)
+
+    since = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    until = since.replace(year=since.year + since.month // 12, month=since.month % 12 + 1)
+    queries = {
+        'Заказы текущего месяца': Order.objects.filter(
+            created_at__gte=since, created_at__lt=until, status='paid',
+        ),
+        'Все заказы': Order.objects.filter(status='paid'),
+    }
+    for label, queryset in queries.items():
+        plan = explain(queryset)
+        scanned = sorted(set(re.findall(r'\btwotails_order_p\d{4}_\d{2}\b', plan)))
+        stdout.write(f'{label}: просканировано секций {len(scanned)} ({", ".join(scanned[:3])}...)')
+        with timed(stdout, f'{label}, выборка'):
+            len(queryset)
+
+
+@task('benchmark.noop')
+def noop_task(**payload):
+    pass
+
+
+def _drain_queue(_):
+    try:
+        return work(stop_when_empty=True, batch_size=20)
+    finally:
+        connections.close_all()
+
+
+@scenario('job_queue', default_size=20000, rollback=False)
+def job_queue(stdout, size):
+    for workers in (1, 4, 16):
+        Job.objects.bulk_create(
+            (Job(name='benchmark.noop', priority=random.choice([0, 5, 9])) for _ in range(size)),
+            batch_size=5000,
+        )
+        connections.close_all()
+        started = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            processed = sum(pool.map(_drain_queue, range(workers)))
+        elapsed = time.perf_counter() - started
+        jobs = Job.objects.filter(name='benchmark.noop')
+        duplicates = jobs.exclude(status='done', attempts=1).count()
+        stdout.write(
+            f'Воркеров {workers}: {processed} задач за {elapsed:.2f} с '
+            f'({processed / elapsed:.0f} в секунду), повторных запусков {duplicates}'
+        )
+        jobs.delete()
+
+
+@scenario('order_shipping', default_size=50000)
+def order_shipping(stdout, size):
+    orders = seed_orders(size, seed_catalogue(500), months=1, statuses=['paid'])
+    ids = [order.id for order in orders]
+    analyze(Order, OrderItem, Product)
+
+    sample = Order.objects.filter(pk__in=ids[:1000])
+    with timed(stdout, f'Поштучное сохранение, {sample.count()} заказов'):
+        for order in sample:
+            order.status = 'shipped'
+            order.save(update_fields=['status'])
+
+    with timed(stdout, f'Отмена {len(ids[1000::10])} заказов с возвратом на склад'):
+        order_transition(Order.objects.filter(pk__in=ids[1000::10]), 'cancelled')
+    with timed(stdout, f'Один UPDATE с условием по статусу, {size} заказов'):
+        moved = order_transition(Order.objects.filter(pk__in=ids), 'shipped')
+    stdout.write(f'Отправлено {len(moved)}, пропущено уже отправленных или отменённых {size - len(moved)}')
+
+
+def _fill_carts(args):
+    product_id, cart_ids = args
+    reserved = 0
+    try:
+        for cart_id in cart_ids:
+            quantity = random.randint(1, 3)
+            try:
+                CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+            except InsufficientStock:
+                continue
+            reserved += quantity
+        return reserved
+    finally:
+        connections.close_all()
+
+
+@scenario('reservations', default_size=400, rollback=False)
+def reservations(stdout, size, stock=100, workers=16):
+    Role.objects.get_or_create(name='user')
+    product = Product.objects.create(name='Ходовой товар', description='', purchase_price=10,
+                                     sale_price=20, manufacturer='', current_quantity=stock)
+    users = User.objects.bulk_create(User(username=f'bench-cart-{product.pk}-{i}') for i in range(size))
+    carts = Cart.objects.bulk_create(Cart(user=user, status='active') for user in users)
+    cart_ids = [cart.pk for cart in carts]
+    connections.close_all()
+    try:
+        with timed(stdout, f'{size} корзин в {workers} процессах'):
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                granted = sum(pool.map(
+                    _fill_carts, [(product.pk, cart_ids[i::workers]) for i in range(workers)],
+                ))
+        reserved = StockReservation.objects.filter(product=product).aggregate(total=Sum('quantity'))['total']
+        stdout.write(f'Остаток {stock}, выдано резервов {granted}, в таблице резервов {reserved}')
+        stdout.write('Перепродажи нет' if reserved == granted <= stock else 'ПЕРЕПРОДАЖА')
+    finally:
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        product.delete()
+
+
+def _hammer_hot_key(mode, duration, computes, reads):
+    def compute():
+        with computes.get_lock():
+            computes.value += 1
+        time.sleep(0.2)
+        return 'значение'
+
+    cache = caches['default']
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        if mode == 'naive':
+            if cache.get('bench:naive') is None:
+                cache.set('bench:naive', compute(), 5)
+        else:
+            get_or_compute('bench:guarded', compute, timeout=5)
+        with reads.get_lock():
+            reads.value += 1
+
+
+@scenario('cache_stampede', default_size=16, rollback=False)
+def cache_stampede(stdout, size, duration=12):
+    # size — число процессов, одновременно читающих горячий ключ с TTL 5 с.
+    context = multiprocessing.get_context('fork')
+    for mode in ('naive', 'guarded'):
+        caches['default'].delete_many(['bench:naive', 'bench:guarded'])
+        computes, reads = context.Value('i', 0), context.Value('i', 0)
+        processes = [context.Process(target=_hammer_hot_key, args=(mode, duration, computes, reads))
+                     for _ in range(size)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        stdout.write(f'{mode}: чтений {reads.value}, вычислений {computes.value} за {duration} с')
+
+
+def seed_promotions(products, promotions=20, share=0.2):
+    today = timezone.now().date()
+    promotion_objs = Promotion.objects.bulk_create(
+        Promotion(name=f'Акция {i}', description='', discount_percent=random.randint(5, 50),
+                  start_date=today - timedelta(days=10), end_date=today + timedelta(days=10),
+                  is_active=True)
+        for i in range(promotions)
+    )
+    ProductPromotion.objects.bulk_create(
+        (ProductPromotion(product=product, promotion=random.choice(promotion_objs))
+         for product in random.sample(products, int(len(products) * share))),
+        batch_size=5000,
+    )
+    return promotion_objs
+
+
+def naive_facets(category_id):
+    products = Product.objects.filter(category_id__in=subtree_ids(category_id))
+    edges = [0, *price_edges(), 10 ** 9]
+    return {
+        'manufacturer': {
+            name: products.filter(manufacturer=name).count()
+            for name in products.values_list('manufacturer', flat=True).distinct()
+        },
+        'supplier': {
+            supplier: products.filter(supplier_id=supplier).count()
+            for supplier in products.values_list('supplier_id', flat=True).distinct()
+        },
+        'promotion': {
+            promotion: products.filter(promotions=promotion).count()
+            for promotion in active_on().values_list('pk', flat=True)
+        },
+        'price': {
+            bucket: products.filter(sale_price__gte=low, sale_price__lt=high).count()
+            for bucket, (low, high) in enumerate(zip(edges, edges[1:]))
+        },
+    }
+
+
+@scenario('facets', default_size=50000)
+def facets(stdout, size):
+    products = seed_catalogue(size, categories=40)
+    seed_promotions(products)
+    analyze(Product, ProductPromotion, Category)
+    category = products[0].category
+    root = category.parent or category
+    stdout.write(f'Товаров в разделе: {Product.objects.filter(category_id__in=subtree_ids(root.pk)).count()}')
+    with timed(stdout, 'Наивный подсчёт (COUNT на каждое значение)'):
+        naive_facets(root.pk)
+    with timed(stdout, 'Один запрос с GROUPING SETS'):
+        result = compute_facets(root.pk, {})
+    with timed(stdout, 'Один запрос с фильтрами'):
+        compute_facets(root.pk, {'price': [1, 2], 'manufacturer': [result['manufacturer'][0]['value']]})
+
+
+@scenario('static_compression', default_size=0)
+def static_compression(stdout, size):
+    # Нужен collectstatic: сравниваются файлы в STATIC_ROOT и их сжатые версии.
+    totals = {'identity': 0, 'gzip': 0, 'br': 0}
+    files, found = 0, set()
+    for root, _, names in os.walk(settings.STATIC_ROOT):
+        for name in names:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            size = os.path.getsize(path)
+            variants = encoded_variants(path)
+            files += 1
+            totals['identity'] += size
+            found.update(variants)
+            for encoding in ('gzip', 'br'):
+                totals[encoding] += os.path.getsize(variants[encoding]) if encoding in variants else size
+    if not files:
+        stdout.write('STATIC_ROOT пуст — сначала выполните collectstatic')
+        return
+    for encoding, total in totals.items():
+        if encoding != 'identity' and encoding not in found:
+            stdout.write(f'{encoding}: сжатых версий нет')
+            continue
+        stdout.write(f'{encoding}: {files} файлов, {total / 1024:.1f} КБ '
+                     f'({total / totals["identity"] * 100:.0f}% от исходного)')
+
+
+def wsgi_get(application, url):
+    path = urlsplit(url)
+    environ = {'PATH_INFO': path.path, 'QUERY_STRING': path.query, 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(body)
+    finally:
+        body.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, url):
+    path = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path.path, 'raw_path': path.path.encode(),
+        'query_string': path.query.encode(), 'root_path': '', 'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    requested, statuses = False, []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+async def _asgi_load(application, urls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url):
+        async with semaphore:
+            return await asgi_get(application, url)
+
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+@scenario('asgi_vs_wsgi', default_size=2000, rollback=False)
+def asgi_vs_wsgi(stdout, size, concurrency=64, threads=8):
+    # Обе точки входа вызываются в процессе, без сетевого сервера: сравнивается
+    # обработка size запросов к каталогу и карточке товара при одинаковой нагрузке.
+    from config.asgi import application as asgi_application
+    from config.wsgi import application as wsgi_application
+
+    products = seed_catalogue(2000)
+    try:
+        categories = list({product.category_id for product in products})
+        urls = [
+            random.choice([f'/api/products/?category={random.choice(categories)}',
+                           f'/api/products/{random.choice(products).pk}/'])
+            for _ in range(size)
+        ]
+        connections.close_all()
+        with timed(stdout, f'WSGI, {threads} потоков, {size} запросов'):
+            with ThreadPoolExecutor(threads) as pool:
+                statuses = list(pool.map(lambda url: wsgi_get(wsgi_application, url), urls))
+        stdout.write(f'  ответов 200: {statuses.count(200)}')
+        with timed(stdout, f'ASGI, {concurrency} одновременных запросов, {size} запросов'):
+            statuses = asyncio.run(_asgi_load(asgi_application, urls, concurrency))
+        stdout.write(f'  ответов 200: {statuses.count(200)}')
+    finally:
+        connections.close_all()
+        Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+        Category.objects.filter(pk__in={product.category_id for product in products}).delete()
+
+
+def seed_order_lines(orders, products, items_per_order=4, days=30):
+    """Заказы и их строки одним SQL-запросом: bulk_create на миллионы строк слишком медленный.
+
+    Товары заказа берутся рядом с «базовым» товаром, а базовый смещён к началу
+    списка, поэтому есть и популярные товары, и устойчивые пары.
+    """
+    qn = connection.ops.quote_name
+    ids = [product.pk for product in products]
+    with connection.cursor() as cursor:
+        if is_partitioned(Order._meta.db_table):
+            this_month = month_start(timezone.now().date())
+            ensure_partitions(add_months(this_month, -(days // 28 + 1)), this_month, cursor)
+        cursor.execute(
+            f'WITH o AS ('
+            f'  INSERT INTO {qn(Order._meta.db_table)} (status, total_amount, created_at)'
+            f"  SELECT 'paid', 0, now() - random() * %s * interval '1 day' FROM generate_series(1, %s)"
+            f'  RETURNING id, created_at'
+            f'), b AS (SELECT id, created_at, floor(%s * power(random(), 2))::int AS base FROM o)'
+            f' INSERT INTO {qn(OrderItem._meta.db_table)}'
+            f'  (order_id, order_created_at, product_id, quantity, price_at_purchase)'
+            f' SELECT b.id, b.created_at, (%s::bigint[])[1 + (b.base + floor(random() * 20)::int) %% %s], 1, 0'
+            f' FROM b CROSS JOIN generate_series(1, %s)',
+            [days, orders, len(ids), ids, len(ids), items_per_order],
+        )
+        return cursor.rowcount
+
+
+@scenario('recommendations', default_size=300000)
+def recommendations(stdout, size, sample=20):
+    from . import recommendations as recs
+
+    products = seed_catalogue(5000)
+    lines = seed_order_lines(size, products)
+    analyze(Order, OrderItem)
+    stdout.write(f'Строк заказов: {lines}')
+
+    sample_ids = [product.pk for product in products[:sample]]
+    with timed(stdout, f'Самосоединение OrderItem через ORM, {sample} товаров'):
+        for product_id in sample_ids:
+            list(
+                OrderItem.objects
+                .filter(order__in=OrderItem.objects.filter(product_id=product_id).values('order_id'))
+                .exclude(product_id=product_id)
+                .values('product_id').annotate(orders=Count('order_id', distinct=True))
+                .order_by('-orders')[:10]
+            )
+
+    with timed(stdout, 'Чтение строк серверным курсором'):
+        order_ids, product_ids = recs.order_lines()
+    with timed(stdout, 'Матрица совместных покупок и top-K'):
+        products_index, popularity, pairs = recs.cooccurrence(order_ids, product_ids)
+        neighbours = recs.top_neighbours(products_index, popularity, pairs)
+    with timed(stdout, f'Запись {len(neighbours["product"])} пар'):
+        recs.store(neighbours)
+    analyze(ProductNeighbour)
+
+    with timed(stdout, f'Выборка соседей, {sample} товаров'):
+        for product_id in sample_ids:
+            list(ProductNeighbour.objects.filter(product_id=product_id)
+                 .select_related('neighbour').order_by('-score')[:10])
+    stdout.write(explain(ProductNeighbour.objects.filter(product_id=sample_ids[0]).order_by('-score')[:10]))
+
+
+def _forecast_one(product, days, alpha):
+    # Так считался бы прогноз без NumPy: запрос и цикл по дням на каждый товар.
+    since = timezone.now() - timedelta(days=days)
+    by_day = dict(
+        OrderItem.objects.filter(product=product, order_created_at__gte=since)
+        .exclude(order__status='cancelled')
+        .values_list(TruncDate('order_created_at')).annotate(quantity=Sum('quantity'))
+    )
+    start = timezone.localdate() - timedelta(days=days)
+    level = sum(by_day.values()) / days
+    for offset in range(days):
+        level = alpha * by_day.get(start + timedelta(days=offset), 0) + (1 - alpha) * level
+    return level
+
+
+@scenario('forecast', default_size=200000)
+def forecast(stdout, size, sample=100):
+    from .forecasting import forecast as vectorized_forecast, suggest_supplies
+
+    products = seed_catalogue(5000)
+    lines = seed_order_lines(size, products, days=90)
+    analyze(Order, OrderItem, Product)
+    stdout.write(f'Строк заказов за 90 дней: {lines}, товаров: {len(products)}')
+
+    with timed(stdout, f'Запрос и цикл на каждый товар, {sample} товаров'):
+        for product in products[:sample]:
+            _forecast_one(product, 90, 0.3)
+    with timed(stdout, f'Векторный прогноз, {len(products)} товаров'):
+        result = vectorized_forecast(products)
+    stdout.write(f'Товаров к дозаказу: {int((result["reorder"] > 0).sum())}')
+    with timed(stdout, 'Черновики поставок по поставщикам'):
+        supplies = suggest_supplies()
+    stdout.write(f'Черновиков: {len(supplies)}, позиций: '
+                 f'{SupplyItem.objects.filter(supply__in=supplies.values()).count()}')
+
+
+@scenario('price_history', default_size=5000)
+def price_history(stdout, size, changes=20):
+    from .pricing import margin_report, prices_as_of
+
+    products = seed_catalogue(size)
+    ids = [product.pk for product in products]
+    now = timezone.now()
+    PriceHistory.objects.bulk_create(
+        (PriceHistory(product_id=product_id, sale_price=random.randint(100, 5000),
+                      purchase_price=random.randint(50, 4000), discount_percent=0,
+                      valid_from=now - timedelta(days=30 * change))
+         for product_id in ids for change in range(changes)),
+        batch_size=10000,
+    )
+    seed_order_lines(size * 20, products, days=365)
+    analyze(PriceHistory, Order, OrderItem)
+    at = now - timedelta(days=100)
+
+    with timed(stdout, f'Цены на дату, запрос на каждый товар, {size} товаров'):
+        for product_id in ids:
+            PriceHistory.objects.filter(product_id=product_id, valid_from__lte=at).order_by('-valid_from').first()
+    with timed(stdout, f'Цены на дату одним запросом, {size} товаров'):
+        prices_as_of(ids, at)
+    with timed(stdout, f'Маржа за год по закупочной цене на дату заказа, {size * 20 * 4} строк'):
+        margin_report(now - timedelta(days=365), now)
+
+
+@scenario('promotion_assign', default_size=100000, rollback=True)
+def promotion_assign(stdout, size, sample=2000):
+    products = seed_catalogue(size, categories=8, suppliers=2)
+    analyze(Product, Category)
+    promotions = seed_promotions(products[:1], promotions=3, share=0)
+    root = products[0].category.parent or products[0].category
+    ProductPromotion.objects.filter(promotion__in=promotions).delete()
+
+    with timed(stdout, f'Инлайн: по одной связи через save(), {sample} товаров'):
+        for product in products[:sample]:
+            ProductPromotion.objects.create(product=product, promotion=promotions[0])
+    with timed(stdout, f'bulk_create(ignore_conflicts=True), {size} товаров'):
+        ProductPromotion.objects.bulk_create(
+            (ProductPromotion(product=product, promotion=promotions[1]) for product in products),
+            batch_size=10000, ignore_conflicts=True,
+        )
+    everything = Product.objects.filter(pk__in=[product.pk for product in products])
+    with timed(stdout, f'INSERT ... SELECT, поставщик {products[0].supplier_id}'):
+        added = assign([promotions[2].pk], products_for(supplier=products[0].supplier_id))
+    stdout.write(f'  затронуто товаров {len(added)}')
+    with timed(stdout, f'INSERT ... SELECT, поддерево категории {root.pk}'):
+        added = assign([promotions[2].pk], products_for(category=root))
+    stdout.write(f'  затронуто товаров {len(added)} (уже привязанные пропущены)')
+    with timed(stdout, 'INSERT ... SELECT, все товары в три акции повторно'):
+        added = assign([promotion.pk for promotion in promotions], everything)
+    stdout.write(f'  затронуто товаров {len(added)}')
+
+
+@scenario('metrics_overhead', default_size=3000, rollback=False)
+def metrics_overhead(stdout, size, rounds=3):
+    # Одни и те же запросы через WSGI с метриками и без них (middleware и обёртка
+    # execute); соединение держится открытым, чтобы не мерить подключение к базе.
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db.backends.signals import connection_created
+    from django.test.utils import override_settings
+
+    from . import metrics
+    from .signals import install_query_metrics
+
+    with timed(stdout, '100 000 наблюдений гистограммы'):
+        for _ in range(100000):
+            metrics.QUERY_LATENCY.observe('bench', 'bench', value=0.001)
+    metrics.QUERY_LATENCY.values.pop(('bench', 'bench'), None)
+
+    products = seed_catalogue(500)
+    categories = list({product.category_id for product in products})
+    urls = [
+        random.choice([f'/api/products/?category={random.choice(categories)}',
+                       f'/api/products/{random.choice(products).pk}/',
+                       f'/api/categories/{random.choice(categories)}/facets/'])
+        for _ in range(size)
+    ]
+    with override_settings(MIDDLEWARE=[name for name in settings.MIDDLEWARE
+                                       if name != 'twotails.metrics.MetricsMiddleware']):
+        plain = WSGIHandler()
+    instrumented = WSGIHandler()
+    max_age = connection.settings_dict['CONN_MAX_AGE']
+    connection.settings_dict['CONN_MAX_AGE'] = None
+    totals = {'без метрик': 0.0, 'с метриками': 0.0}
+    try:
+        for label, application in [('прогрев', plain)] + [
+            pair for _ in range(rounds) for pair in (('без метрик', plain), ('с метриками', instrumented))
+        ]:
+            enabled = application is instrumented
+            connection.close()
+            if enabled:
+                connection_created.connect(install_query_metrics)
+            else:
+                connection_created.disconnect(install_query_metrics)
+                # Обёртка остаётся в объекте соединения и после close().
+                if metrics.observe_query in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(metrics.observe_query)
+            started = time.perf_counter()
+            statuses = [wsgi_get(application, url) for url in urls]
+            if label in totals:
+                totals[label] += time.perf_counter() - started
+            assert set(statuses) == {200}, set(statuses)
+        for label, total in totals.items():
+            stdout.write(f'{label}: {total / (rounds * size) * 1000:.3f} мс на запрос')
+        overhead = (totals['с метриками'] - totals['без метрик']) / (rounds * size) * 1e6
+        stdout.write(f'Накладные расходы: {overhead:.0f} мкс на запрос '
+                     f'({overhead / 1e6 * rounds * size / totals["без метрик"] * 100:.1f}%)')
+        with timed(stdout, 'Отрисовка /metrics'):
+            text = metrics.render()
+        stdout.write(f'  {len(text.splitlines())} строк')
+    finally:
+        connection_created.connect(install_query_metrics)
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.close()
+        Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+        Category.objects.filter(pk__in={product.category_id for product in products}).delete()
@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum
+from django.utils import timezone
+
+from .cache import bump_versions, get_or_compute, get_versions
+from .models import Category, OrderItem, Product
+from .promotions import active_on
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Фрагменты стартовых данных; у каждого своя версия в кэше (см. signals.py).
+FRAGMENTS = ('categories', 'promotions', 'products')
+
+
+def bootstrap_timeout():
+    return getattr(settings, 'BOOTSTRAP_CACHE_TIMEOUT', 300)
+
+
+def category_tree():
+    nodes = {
+        category['id']: {**category, 'children': []}
+        for category in Category.objects.order_by('name').values('id', 'name', 'parent_id', 'product_count')
+    }
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.pop('parent_id'))
+        (parent['children'] if parent else roots).append(node)
+    return roots
+
+
+def active_promotions():
+    return list(
+        active_on()
+        .order_by('end_date')
+        .values('id', 'name', 'discount_percent', 'end_date')
+    )
+
+
+def top_products(limit=12, days=30):
+    # Самые продаваемые за последние дни; order_created_at отсекает старые секции.
+    since = timezone.now() - timedelta(days=days)
+    sold = (
+        OrderItem.objects
+        .filter(order_created_at__gte=since)
+        .values('product_id')
+        .annotate(sold=Sum('quantity'))
+        .order_by('-sold')
+        .values_list('product_id', flat=True)[:limit]
+    )
+    ids = list(sold)
+    products = {
+        product['id']: product
+        for product in Product.objects.filter(pk__in=ids, current_quantity__gt=0)
+        .values('id', 'name', 'sale_price', 'has_discount', 'discount_percent', 'category_id')
+    }
+    return [products[pk] for pk in ids if pk in products]
+
+
+BUILDERS = {
+    'categories': category_tree,
+    'promotions': active_promotions,
+    'products': top_products,
+}
+
+
+def bump_fragment(*names):
+    bump_versions('bootstrap', names)
+
+
+def build_payload(versions):
+    data = {
+        name: get_or_compute(f'bootstrap:{name}:v{versions[name]}', BUILDERS[name],
+                             timeout=bootstrap_timeout())
+        for name in FRAGMENTS
+    }
+    body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    encoded = {'identity': body, 'gzip': gzip.compress(body, 9)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body, quality=11)
+    return {'etag': hashlib.sha1(body).hexdigest(), 'encoded': encoded}
+
+
+def get_payload():
+    """Готовый ответ: ETag и тело во всех кодировках, сжатые один раз на версию."""
+    versions = get_versions('bootstrap', FRAGMENTS)
+    key = 'bootstrap:payload:' + ':'.join(f'{name}{versions[name]}' for name in FRAGMENTS)
+    payload = caches['default'].get(key)
+    if payload is None:
+        payload = build_payload(versions)
+        caches['default'].set(key, payload, bootstrap_timeout())
+    return payload
+
+
+def negotiate_encoding(accept_encoding, available):
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            accepted[name.strip().lower()] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
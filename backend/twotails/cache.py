@@ -0,0 +1,172 @@
+import math
+import random
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import cache_lookups
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: L1 в памяти процесса перед общим L2.
+
+    L1 (обычно LocMemCache с MAX_ENTRIES — это LRU с ограниченным размером)
+    хранит значения не дольше LOCAL_TIMEOUT секунд, поэтому изменения,
+    сделанные другими процессами, видны с задержкой не больше этого срока.
+    add() и incr() выполняются только в L2: на них строятся блокировки.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._local_alias = options.get('LOCAL', 'local')
+        self._shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+
+    @property
+    def local(self):
+        return caches[self._local_alias]
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        value = self.local.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            cache_lookups('local')
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            cache_lookups('miss')
+            return default
+        cache_lookups('shared')
+        self.local.set(key, value, self.local_timeout, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = self.local.get_many(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        cache_lookups('local', len(found))
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            self.local.set_many(shared, self.local_timeout, version=version)
+            found.update(shared)
+            cache_lookups('shared', len(shared))
+            cache_lookups('miss', len(missing) - len(shared))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self.local.set(key, value, self._local_ttl(timeout), version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.local.set_many(data, self._local_ttl(timeout), version=version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.incr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        self.local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.local.has_key(key, version=version) or self.shared.has_key(key, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+def get_or_compute(key, compute, timeout=300, beta=1.0, lock_timeout=10, cache=None):
+    """Возвращает значение из кэша, вычисляя его не более чем в одном процессе.
+
+    Промах: вычисляет тот, кто взял блокировку (add в L2), остальные ждут
+    появления значения. Незадолго до истечения срока один из читателей
+    обновляет значение заранее с вероятностью, растущей к концу срока
+    (XFetch, beta — агрессивность), а остальные продолжают получать старое.
+    """
+    cache = cache or caches['default']
+    lock_key = f'lock:{key}'
+    entry = cache.get(key)
+    if entry is not None:
+        value, duration, expires_at = entry
+        if time.time() - duration * beta * math.log(1 - random.random()) < expires_at:
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            return value
+    elif not cache.add(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        # Владелец блокировки не успел: вычисляем сами, чтобы не висеть вечно.
+
+    try:
+        # Пока мы ждали блокировку или читали устаревший L1, значение могли
+        # уже пересчитать — проверяем общий уровень, минуя L1.
+        latest = getattr(cache, 'shared', cache).get(key)
+        if latest is not None and (entry is None or latest[2] > entry[2]):
+            return latest[0]
+        started = time.time()
+        value = compute()
+        duration = time.time() - started
+        cache.set(key, (value, duration, time.time() + timeout), timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def get_versions(kind, pks, cache=None):
+    # Версия — отметка времени последнего изменения в мс; отсутствующая
+    # версия заводится заново, а не обнуляется, чтобы не совпасть со старыми ключами.
+    cache = cache or caches['default']
+    keys = {version_key(kind, pk): pk for pk in pks}
+    found = cache.get_many(list(keys))
+    missing = {key: int(time.time() * 1000) for key in keys if key not in found}
+    for key, version in missing.items():
+        cache.add(key, version, None)
+    if missing:
+        found.update(cache.get_many(list(missing)))
+    return {pk: found.get(key, missing.get(key)) for key, pk in keys.items()}
+
+
+def bump_versions(kind, pks, cache=None):
+    cache = cache or caches['default']
+    now = int(time.time() * 1000)
+    cache.set_many({version_key(kind, pk): now for pk in pks}, None)
+
+
+def versioned_key(kind, pk, *parts, cache=None):
+    version = get_versions(kind, [pk], cache)[pk]
+    return ':'.join([kind, str(pk), f'v{version}', *map(str, parts)])
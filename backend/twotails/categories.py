@@ -0,0 +1,93 @@
+import logging
+
+from django.db import connection
+
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+
+def _table():
+    return connection.ops.quote_name(Category._meta.db_table)
+
+
+def subtree_ids(category_id):
+    """id категории и всех её потомков (рекурсивный обход по parent в одном запросе)."""
+    table = _table()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH RECURSIVE subtree(id) AS ('
+            f'  SELECT id FROM {table} WHERE id = %s'
+            f'  UNION SELECT c.id FROM {table} c JOIN subtree s ON c.parent_id = s.id'
+            f') SELECT id FROM subtree',
+            [category_id],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def adjust_counts(category_id, delta, direct=True):
+    """Прибавляет delta к счётчикам категории и всех её предков одним UPDATE.
+
+    Счётчик ниже нуля значит, что товары меняли в обход сигналов (bulk_create,
+    loaddata, update()): CHECK (>= 0) не даёт записать такое значение, поэтому
+    оно обрезается до нуля, а расхождение пишется в лог — чинит recount_all().
+    """
+    if category_id is None or not delta:
+        return
+    table = _table()
+    with connection.cursor() as cursor:
+        # chain читает счётчики до UPDATE (тот же снимок), по ним видно расхождение.
+        cursor.execute(
+            f'WITH RECURSIVE chain(id, parent_id, total, direct) AS ('
+            f'  SELECT id, parent_id, product_count, direct_product_count FROM {table} WHERE id = %s'
+            f'  UNION SELECT c.id, c.parent_id, c.product_count, c.direct_product_count'
+            f'  FROM {table} c JOIN chain ON c.id = chain.parent_id'
+            f') UPDATE {table} c SET product_count = GREATEST(c.product_count + %s, 0),'
+            f'  direct_product_count = GREATEST(c.direct_product_count + CASE WHEN c.id = %s THEN %s ELSE 0 END, 0)'
+            f' FROM chain WHERE c.id = chain.id'
+            f' RETURNING c.id, chain.total, chain.direct',
+            [category_id, delta, category_id, delta if direct else 0],
+        )
+        drifted = [pk for pk, total, direct_count in cursor.fetchall()
+                   if total + delta < 0 or (direct and pk == category_id and direct_count + delta < 0)]
+    if drifted:
+        logger.warning('Счётчики товаров категорий %s ушли бы ниже нуля; запустите recount_categories',
+                       drifted)
+
+
+def subtree_count(category_id):
+    # Читаем с основной базы: счётчик только что могли изменить в этой транзакции.
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT product_count FROM {_table()} WHERE id = %s', [category_id])
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def move_subtree(category_id, old_parent_id, new_parent_id):
+    """Переносит счётчик поддерева от старых предков к новым."""
+    count = subtree_count(category_id)
+    adjust_counts(old_parent_id, -count, direct=False)
+    adjust_counts(new_parent_id, count, direct=False)
+
+
+def recount_all():
+    """Полный пересчёт счётчиков: после загрузки данных и массовых update()."""
+    table, products = _table(), connection.ops.quote_name(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH RECURSIVE tree(root, id) AS ('
+            f'  SELECT id, id FROM {table}'
+            f'  UNION SELECT tree.root, c.id FROM {table} c JOIN tree ON c.parent_id = tree.id'
+            f'), direct AS ('
+            f'  SELECT category_id AS id, COUNT(*) AS n FROM {products}'
+            f'  WHERE category_id IS NOT NULL GROUP BY category_id'
+            f'), totals AS ('
+            f'  SELECT c.id, COALESCE(d.n, 0) AS direct,'
+            f'    (SELECT COALESCE(SUM(direct.n), 0) FROM tree JOIN direct ON direct.id = tree.id'
+            f'     WHERE tree.root = c.id) AS total'
+            f'  FROM {table} c LEFT JOIN direct d ON d.id = c.id'
+            f') UPDATE {table} c SET direct_product_count = totals.direct, product_count = totals.total'
+            f' FROM totals WHERE totals.id = c.id'
+            f' AND (c.direct_product_count, c.product_count) IS DISTINCT FROM (totals.direct, totals.total)',
+        )
+        return cursor.rowcount
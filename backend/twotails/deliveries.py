@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DeliveryItem, DeliveryStatusLog
+from .transitions import InvalidTransition, add_stock, conditional_update
+
+# Допустимые переходы: новый статус -> статусы, из которых в него можно попасть.
+TRANSITIONS = {
+    'confirmed': ('pending',),
+    'rejected': ('pending',),
+    'assembling': ('confirmed',),
+    'in_progress': ('assembling',),
+    'received': ('in_progress',),
+    'canceled': ('confirmed', 'assembling', 'in_progress'),
+}
+
+
+def transition(queryset, target, user=None):
+    """Переводит доставки из queryset в статус target; возвращает id переведённых."""
+    if target not in TRANSITIONS:
+        raise InvalidTransition(f'Недопустимый статус: {target}')
+    now = timezone.now()
+    moved = []
+    with transaction.atomic():
+        for source in TRANSITIONS[target]:
+            ids = conditional_update(queryset, source, {'status': target, 'status_changed_at': now})
+            moved.extend(ids)
+            DeliveryStatusLog.objects.bulk_create(
+                [DeliveryStatusLog(delivery_id=pk, from_status=source, to_status=target,
+                                   changed_at=now, changed_by=user)
+                 for pk in ids],
+                batch_size=5000,
+            )
+        if target == 'received' and moved:
+            # На приёмке все количества из доставок прибавляются к остаткам одним запросом.
+            add_stock(DeliveryItem, 'delivery', moved, record_last_delivery=True)
+    return moved
@@ -0,0 +1,126 @@
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Category, Order, OrderItem, Product, Supplier
+
+# Денормализованные факты продаж: одна строка на элемент заказа.
+SCHEMA = pa.schema([
+    ('order_id', pa.int64()),
+    ('order_created_at', pa.timestamp('us', tz='UTC')),
+    ('order_status', pa.string()),
+    ('user_id', pa.int64()),
+    ('product_id', pa.int64()),
+    ('product_name', pa.string()),
+    ('manufacturer', pa.string()),
+    ('category_id', pa.int64()),
+    ('category_name', pa.string()),
+    ('supplier_id', pa.int64()),
+    ('supplier_name', pa.string()),
+    ('quantity', pa.int32()),
+    ('price_at_purchase', pa.float64()),
+    ('revenue', pa.float64()),
+])
+STATE_FILE = '_state.json'
+# Заказы моложе этого срока не выгружаем: транзакция с меньшим id могла ещё
+# не закоммититься, а следующий запуск начнёт уже после неё.
+SETTLE_TIME = timedelta(minutes=5)
+
+
+def export_dir():
+    return Path(getattr(settings, 'SALES_EXPORT_DIR', settings.BASE_DIR / 'exports' / 'sales'))
+
+
+def load_state(directory):
+    try:
+        return json.loads((directory / STATE_FILE).read_text())
+    except FileNotFoundError:
+        return {'last_order_id': 0}
+
+
+def save_state(directory, state):
+    tmp = directory / f'{STATE_FILE}.tmp'
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, directory / STATE_FILE)
+
+
+def facts_sql():
+    order, item, product, category, supplier = (
+        connection.ops.quote_name(model._meta.db_table)
+        for model in (Order, OrderItem, Product, Category, Supplier)
+    )
+    return (
+        f'SELECT o.id, o.created_at, o.status, o.user_id, i.product_id, p.name, p.manufacturer,'
+        f'  p.category_id, c.name, p.supplier_id, s.name, i.quantity, i.price_at_purchase,'
+        f'  i.quantity * i.price_at_purchase'
+        f' FROM {order} o'
+        # Условие по дате заказа позволяет соединять секции попарно.
+        f' JOIN {item} i ON i.order_id = o.id AND i.order_created_at = o.created_at'
+        f' LEFT JOIN {product} p ON p.id = i.product_id'
+        f' LEFT JOIN {category} c ON c.id = p.category_id'
+        f' LEFT JOIN {supplier} s ON s.id = p.supplier_id'
+        f' WHERE o.id > %s AND o.created_at < %s'
+        f' ORDER BY o.id'
+    )
+
+
+class MonthWriters:
+    """По одному Parquet-файлу на месяц: month=YYYY-MM/part-<первый order_id>.parquet."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.writers = {}
+
+    def write(self, batch):
+        months = pc.strftime(batch.column('order_created_at'), format='%Y-%m')
+        for month in pc.unique(months).to_pylist():
+            part = batch.filter(pc.equal(months, month))
+            if month not in self.writers:
+                path = self.directory / f'month={month}' / f'part-{part.column("order_id")[0].as_py()}.parquet'
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix('.parquet.tmp')
+                self.writers[month] = (pq.ParquetWriter(tmp, SCHEMA, compression='zstd'), tmp, path)
+            self.writers[month][0].write_batch(part)
+
+    def close(self, commit=True):
+        for writer, tmp, path in self.writers.values():
+            writer.close()
+            if commit:
+                os.replace(tmp, path)
+            else:
+                tmp.unlink(missing_ok=True)
+        return [path for _, _, path in self.writers.values()]
+
+
+def export_sales(directory=None, batch_size=50000):
+    """Дописывает в набор Parquet заказы с id больше последнего выгруженного."""
+    directory = Path(directory or export_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    state = load_state(directory)
+    writers = MonthWriters(directory)
+    last_order_id, rows = state['last_order_id'], 0
+    try:
+        with transaction.atomic(), connection.chunked_cursor() as cursor:
+            cursor.execute(facts_sql(), [last_order_id, timezone.now() - SETTLE_TIME])
+            while fetched := cursor.fetchmany(batch_size):
+                columns = list(zip(*fetched))
+                batch = pa.RecordBatch.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, SCHEMA)],
+                    schema=SCHEMA,
+                )
+                writers.write(batch)
+                last_order_id, rows = fetched[-1][0], rows + len(fetched)
+    except BaseException:
+        writers.close(commit=False)
+        raise
+    files = writers.close()
+    save_state(directory, {'last_order_id': last_order_id, 'exported_at': timezone.now().isoformat()})
+    return rows, files
@@ -0,0 +1,123 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .cache import get_or_compute
+from .categories import subtree_ids
+from .models import Product, ProductPromotion, Promotion, Supplier
+
+FACETS = ('manufacturer', 'supplier', 'promotion', 'price')
+
+
+def price_edges():
+    return getattr(settings, 'FACET_PRICE_EDGES', [500, 1000, 2000, 5000])
+
+
+def price_label(bucket, edges):
+    if bucket == 0:
+        return f'до {edges[0]}'
+    if bucket == len(edges):
+        return f'от {edges[-1]}'
+    return f'{edges[bucket - 1]}–{edges[bucket]}'
+
+
+def _conditions(filters, edges):
+    # Условие каждого фасета отдельно: счётчики фасета считаются по всем
+    # фильтрам, кроме его собственного (иначе выбор одного значения обнулил бы остальные).
+    qn = connection.ops.quote_name
+    promotions = qn(ProductPromotion._meta.db_table)
+    conditions = {}
+    if filters.get('manufacturer'):
+        conditions['manufacturer'] = ('p.manufacturer = ANY(%s)', [list(filters['manufacturer'])])
+    if filters.get('supplier'):
+        conditions['supplier'] = ('p.supplier_id = ANY(%s)', [list(filters['supplier'])])
+    if filters.get('promotion'):
+        conditions['promotion'] = (
+            f'EXISTS (SELECT 1 FROM {promotions} f WHERE f.product_id = p.id '
+            f'AND f.promotion_id = ANY(%s))',
+            [list(filters['promotion'])],
+        )
+    if filters.get('price'):
+        conditions['price'] = ('width_bucket(p.sale_price, %s::int[]) = ANY(%s)',
+                               [edges, list(filters['price'])])
+    return conditions
+
+
+def _filter_clause(conditions, exclude=None):
+    parts = [(sql, params) for facet, (sql, params) in conditions.items() if facet != exclude]
+    if not parts:
+        return 'TRUE', []
+    return ' AND '.join(sql for sql, _ in parts), [param for _, params in parts for param in params]
+
+
+def compute_facets(category_id, filters):
+    """Все счётчики фасетов поддерева категории одним запросом с GROUPING SETS."""
+    qn = connection.ops.quote_name
+    edges = price_edges()
+    conditions = _conditions(filters, edges)
+    counts, params = [], []
+    for facet in FACETS:
+        clause, clause_params = _filter_clause(conditions, exclude=facet)
+        counts.append(f'COUNT(DISTINCT p.id) FILTER (WHERE {clause})')
+        params.extend(clause_params)
+    sql = (
+        f'SELECT p.manufacturer, p.supplier_id, pp.promotion_id, '
+        f'       width_bucket(p.sale_price, %s::int[]) AS bucket, '
+        f'       GROUPING(p.manufacturer, p.supplier_id, pp.promotion_id, '
+        f'                width_bucket(p.sale_price, %s::int[])), '
+        f'       {", ".join(counts)} '
+        f'FROM {qn(Product._meta.db_table)} p '
+        f'LEFT JOIN (SELECT pp.product_id, pp.promotion_id '
+        f'           FROM {qn(ProductPromotion._meta.db_table)} pp '
+        f'           JOIN {qn(Promotion._meta.db_table)} pr ON pr.id = pp.promotion_id '
+        f'           WHERE pr.is_active AND pr.start_date <= %s AND pr.end_date >= %s) pp ON pp.product_id = p.id '
+        f'WHERE p.category_id = ANY(%s) '
+        f'GROUP BY GROUPING SETS ((p.manufacturer), (p.supplier_id), (pp.promotion_id), '
+        f'                        (width_bucket(p.sale_price, %s::int[])))'
+    )
+    with connection.cursor() as cursor:
+        today = timezone.localdate()
+        cursor.execute(sql, [edges, edges, *params, today, today, subtree_ids(category_id), edges])
+        rows = cursor.fetchall()
+
+    # GROUPING() — битовая маска несгруппированных столбцов: 0b0111 значит,
+    # что строка относится к набору (manufacturer), 0b1011 — к (supplier_id) и т. д.
+    sets = {0b0111: 'manufacturer', 0b1011: 'supplier', 0b1101: 'promotion', 0b1110: 'price'}
+    values = {facet: {} for facet in FACETS}
+    for manufacturer, supplier_id, promotion_id, bucket, grouping, *facet_counts in rows:
+        facet = sets[grouping]
+        value = {'manufacturer': manufacturer, 'supplier': supplier_id,
+                 'promotion': promotion_id, 'price': bucket}[facet]
+        count = facet_counts[FACETS.index(facet)]
+        if value is not None and count:
+            values[facet][value] = count
+
+    suppliers = Supplier.objects.in_bulk(values['supplier'])
+    promotions = Promotion.objects.in_bulk(values['promotion'])
+    return {
+        'manufacturer': [{'value': name, 'label': name, 'count': count}
+                         for name, count in sorted(values['manufacturer'].items())],
+        'supplier': [{'value': pk, 'label': suppliers[pk].name, 'count': count}
+                     for pk, count in values['supplier'].items() if pk in suppliers],
+        'promotion': [{'value': pk, 'label': promotions[pk].name, 'count': count}
+                      for pk, count in values['promotion'].items() if pk in promotions],
+        'price': [{'value': bucket, 'label': price_label(bucket, edges), 'count': count}
+                  for bucket, count in sorted(values['price'].items())],
+    }
+
+
+def filter_signature(category_id, filters):
+    normalized = {facet: sorted(filters.get(facet) or []) for facet in FACETS}
+    raw = json.dumps([category_id, normalized], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_facets(category_id, filters):
+    return get_or_compute(
+        f'facets:{filter_signature(category_id, filters)}',
+        lambda: compute_facets(category_id, filters),
+        timeout=getattr(settings, 'FACET_CACHE_TIMEOUT', 300),
+    )
@@ -0,0 +1,115 @@
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderItem, Product, Supply, SupplyItem
+
+
+def option(name, default):
+    return getattr(settings, name, default)
+
+
+def daily_sales(product_ids, days, today=None):
+    """Матрица продаж товары x дни (последний столбец — вчера) из строк заказов."""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days)
+    since, until = (timezone.make_aware(datetime.combine(day, time())) for day in (start, today))
+    index = {product_id: row for row, product_id in enumerate(product_ids)}
+    sales = np.zeros((len(product_ids), days))
+    rows = (
+        OrderItem.objects
+        # order_created_at отсекает старые секции; отменённые заказы не спрос.
+        .filter(order_created_at__gte=since, order_created_at__lt=until)
+        .exclude(order__status='cancelled')
+        .values_list('product_id', TruncDate('order_created_at'))
+        .annotate(quantity=Sum('quantity'))
+    )
+    products, day_numbers, quantities = [], [], []
+    for product_id, day, quantity in rows.iterator(chunk_size=10000):
+        if product_id in index:
+            products.append(index[product_id])
+            day_numbers.append((day - start).days)
+            quantities.append(quantity)
+    np.add.at(sales, (np.array(products, dtype=int), np.array(day_numbers, dtype=int)), quantities)
+    return sales
+
+
+def smoothed_demand(sales, alpha):
+    """Экспоненциальное сглаживание по всем товарам сразу: свёртка с весами alpha * (1 - alpha)^k."""
+    days = sales.shape[1]
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    # Вес, не доставшийся истории, отдаём среднему, чтобы короткая история не занижала спрос.
+    return sales @ weights + (1 - weights.sum()) * sales.mean(axis=1)
+
+
+def forecast(products, days=None, window=None, alpha=None, today=None):
+    """Спрос в день, дни покрытия остатком и рекомендуемый заказ для всех товаров разом."""
+    days = days or option('FORECAST_HISTORY_DAYS', 90)
+    window = window or option('FORECAST_WINDOW_DAYS', 14)
+    alpha = alpha or option('FORECAST_SMOOTHING', 0.3)
+    lead_days = option('REORDER_LEAD_DAYS', 7)
+    safety_days = option('REORDER_SAFETY_DAYS', 7)
+    cover_days = option('REORDER_COVER_DAYS', 30)
+
+    ids = np.array([product.pk for product in products], dtype=np.int64)
+    stock = np.array([product.current_quantity for product in products], dtype=float)
+    shelf_life = np.array([product.expiration_days or cover_days for product in products], dtype=float)
+    sales = daily_sales(ids.tolist(), days, today)
+
+    moving_average = sales[:, -window:].mean(axis=1)
+    smoothed = smoothed_demand(sales, alpha)
+    # Берём большую из оценок: скользящее среднее быстрее ловит рост спроса.
+    demand = np.maximum(moving_average, smoothed)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(demand > 0, stock / demand, np.inf)
+    # Заказываем не больше, чем успеет продаться до истечения срока годности.
+    target_days = np.minimum(lead_days + cover_days, shelf_life)
+    reorder = np.where(
+        days_of_cover < lead_days + safety_days,
+        np.maximum(np.ceil(demand * target_days - stock), 0),
+        0,
+    ).astype(int)
+    return {
+        'product': ids,
+        'moving_average': moving_average,
+        'smoothed': smoothed,
+        'demand': demand,
+        'days_of_cover': days_of_cover,
+        'reorder': reorder,
+    }
+
+
+def suggest_supplies(today=None):
+    """Пересоздаёт черновики поставок по поставщикам из рекомендуемых заказов.
+
+    Прежние непроведённые черновики заменяются: они тоже были расчётными.
+    """
+    products = list(
+        Product.objects.filter(supplier__isnull=False)
+        .only('id', 'supplier_id', 'current_quantity', 'expiration_days')
+    )
+    if not products:
+        return {}
+    result = forecast(products, today=today)
+    by_supplier = {}
+    for product, quantity in zip(products, result['reorder'].tolist()):
+        if quantity > 0:
+            by_supplier.setdefault(product.supplier_id, []).append((product.pk, quantity))
+
+    with transaction.atomic():
+        Supply.objects.filter(is_draft=True).delete()
+        supplies = Supply.objects.bulk_create(
+            Supply(supplier_id=supplier_id, is_draft=True) for supplier_id in by_supplier
+        )
+        # bulk_create минует SupplyItem.save(): черновик остатков не меняет.
+        SupplyItem.objects.bulk_create(
+            SupplyItem(supply=supply, product_id=product_id, quantity=quantity)
+            for supply in supplies
+            for product_id, quantity in by_supplier[supply.supplier_id]
+        )
+    return {supply.supplier_id: supply for supply in supplies}
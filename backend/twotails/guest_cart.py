@@ -0,0 +1,144 @@
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core import signing
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import DatabaseError, transaction
+
+from .models import Cart, CartItem, Product
+from .reservations import InsufficientStock, reserve
+
+# Корзина гостя хранится в подписанной cookie: {product_id: quantity}.
+# Ни сессии, ни строк в БД для анонимных посетителей не создаётся.
+COOKIE_NAME = 'guest_cart'
+COOKIE_SALT = 'twotails.guest_cart'
+COOKIE_MAX_AGE = 30 * 24 * 60 * 60
+MAX_ITEMS = 50
+MAX_QUANTITY = 999
+
+logger = logging.getLogger(__name__)
+
+
+def load(request):
+    try:
+        raw = request.get_signed_cookie(COOKIE_NAME, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+        return {int(product_id): int(quantity) for product_id, quantity in json.loads(raw).items()}
+    except (KeyError, signing.BadSignature, ValueError, AttributeError):
+        return {}
+
+
+def store(response, items):
+    if not items:
+        response.delete_cookie(COOKIE_NAME)
+        return
+    response.set_signed_cookie(
+        COOKIE_NAME, json.dumps(items, separators=(',', ':')), salt=COOKIE_SALT,
+        max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+    )
+
+
+def set_quantity(items, product_id, quantity):
+    items = dict(items)
+    if quantity > MAX_QUANTITY:
+        raise ValueError(f'Нельзя положить в корзину больше {MAX_QUANTITY} шт. одного товара')
+    if quantity > 0:
+        if product_id not in items and len(items) >= MAX_ITEMS:
+            raise ValueError(f'В корзине не может быть больше {MAX_ITEMS} товаров')
+        items[product_id] = quantity
+    else:
+        items.pop(product_id, None)
+    return items
+
+
+def merge(user, items):
+    """Переносит гостевую корзину в активную корзину пользователя одной транзакцией."""
+    # Товар могли удалить, пока он лежал в cookie, а количество в старой
+    # cookie ничем не ограничено — такие позиции отбрасываем или урезаем.
+    known = set(Product.objects.filter(pk__in=items).values_list('pk', flat=True))
+    items = {product_id: min(quantity, MAX_QUANTITY)
+             for product_id, quantity in items.items() if product_id in known and quantity > 0}
+    if not items:
+        return None
+    with transaction.atomic():
+        cart = (Cart.objects.select_for_update().filter(user=user, status='active')
+                .order_by('-updated_at').first())
+        if cart is None:
+            cart = Cart.objects.create(user=user, status='active')
+        existing = {item.product_id: item for item in cart.cartitem_set.filter(product_id__in=items)}
+        for product_id, item in existing.items():
+            item.quantity = min(item.quantity + items[product_id], MAX_QUANTITY)
+        CartItem.objects.bulk_update(existing.values(), ['quantity'])
+        created = CartItem.objects.bulk_create(
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in items.items() if product_id not in existing
+        )
+        # bulk-операции минуют CartItem.save(), поэтому резервируем отдельно;
+        # то, что не помещается в остаток, урезается до доступного количества.
+        for item in [*existing.values(), *created]:
+            try:
+                reserve(item)
+            except InsufficientStock as error:
+                if error.available > 0:
+                    item.quantity = error.available
+                    item.save()
+                else:
+                    item.delete()
+    return cart
+
+
+class GuestCartMiddleware:
+    """После входа переносит гостевую корзину в корзину пользователя и удаляет cookie."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Проверка до обработки запроса ловит уже вошедших пользователей,
+        # после — тех, кто вошёл в этом самом запросе.
+        merged = self.merge(request)
+        response = self.get_response(request)
+        if self.merge(request) or merged:
+            response.delete_cookie(COOKIE_NAME)
+        return response
+
+    async def __acall__(self, request):
+        merged = await self.amerge(request)
+        response = await self.get_response(request)
+        if await self.amerge(request) or merged:
+            response.delete_cookie(COOKIE_NAME)
+        return response
+
+    def merge(self, request):
+        if COOKIE_NAME not in request.COOKIES or getattr(request, '_guest_cart_merged', False):
+            return False
+        if not request.user.is_authenticated:
+            return False
+        try:
+            merge(request.user, load(request))
+        except (DatabaseError, ObjectDoesNotExist):
+            # Битая гостевая корзина не должна ломать каждый запрос, пока жива cookie.
+            logger.exception('Не удалось перенести гостевую корзину пользователя %s', request.user.pk)
+        request._guest_cart_merged = True
+        return True
+
+    async def amerge(self, request):
+        # Без cookie (почти все запросы) не трогаем ни пользователя, ни поток.
+        if COOKIE_NAME not in request.COOKIES or getattr(request, '_guest_cart_merged', False):
+            return False
+        user = await request.auser()
+        if not user.is_authenticated:
+            return False
+        try:
+            await sync_to_async(merge)(user, load(request))
+        except (DatabaseError, ObjectDoesNotExist):
+            logger.exception('Не удалось перенести гостевую корзину пользователя %s', user.pk)
+        request._guest_cart_merged = True
+        return True
@@ -0,0 +1,137 @@
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+LANES = {'high': 0, 'default': 5, 'low': 9}
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+STALE_AFTER = timedelta(minutes=15)
+
+
+def task(name):
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, lane='default', run_at=None, max_attempts=5):
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная задача: {name}')
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        priority=LANES[lane],
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def enqueue_on_commit(name, payload=None, **kwargs):
+    transaction.on_commit(lambda: enqueue(name, payload, **kwargs))
+
+
+def retry_delay(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_jobs(batch_size=10, lanes=None):
+    """Забирает пачку готовых задач; занятые другими воркерами строки пропускаются."""
+    now = timezone.now()
+    queued = Job.objects.filter(status='queued', run_at__lte=now)
+    if lanes:
+        queued = queued.filter(priority__in=[LANES[lane] for lane in lanes])
+    with transaction.atomic():
+        jobs = list(
+            queued.select_for_update(skip_locked=True).order_by('priority', 'run_at')[:batch_size]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status='running', locked_at=now, attempts=F('attempts') + 1,
+            )
+    for job in jobs:
+        job.status, job.locked_at, job.attempts = 'running', now, job.attempts + 1
+    return jobs
+
+
+def run_job(job):
+    """Выполняет задачу и сразу записывает результат; при ошибке планирует повтор."""
+    try:
+        TASKS[job.name](**job.payload)
+    except Exception:
+        logger.exception('Задача %s (%s) завершилась ошибкой', job.pk, job.name)
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(
+                status='failed', last_error=error, finished_at=timezone.now(),
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status='queued', last_error=error, locked_at=None,
+                run_at=timezone.now() + retry_delay(job.attempts),
+            )
+        return False
+    # Отмечаем сразу: при падении воркера посреди пачки готовые задачи не повторятся.
+    Job.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+    return True
+
+
+def touch_job(job):
+    """Продлевает блокировку перед запуском задачи из пачки.
+
+    Если задачу уже вернул в очередь requeue_stale (пачка шла дольше
+    STALE_AFTER), блокировка не наша и задачу надо пропустить.
+    """
+    now = timezone.now()
+    touched = Job.objects.filter(pk=job.pk, status='running', locked_at=job.locked_at).update(locked_at=now)
+    job.locked_at = now
+    return bool(touched)
+
+
+def run_jobs(jobs):
+    processed = 0
+    for job in jobs:
+        if touch_job(job):
+            run_job(job)
+            processed += 1
+    return processed
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """Возвращает в очередь задачи воркеров, которые упали, не завершив их.
+
+    Задачи, исчерпавшие попытки (например, каждый раз роняющие воркер),
+    отмечаются как ошибочные, а не крутятся по кругу.
+    """
+    stale = Job.objects.filter(status='running', locked_at__lt=timezone.now() - stale_after)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_at=None, finished_at=timezone.now(),
+        last_error='Воркер не завершил задачу за отведённое время',
+    )
+    return stale.update(status='queued', locked_at=None) + failed
+
+
+def work(lanes=None, batch_size=10, idle_sleep=1.0, stop_when_empty=False):
+    processed = 0
+    requeue_stale()
+    while True:
+        jobs = claim_jobs(batch_size, lanes)
+        if not jobs:
+            if stop_when_empty:
+                return processed
+            time.sleep(idle_sleep)
+            requeue_stale()
+            continue
+        processed += run_jobs(jobs)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from twotails.archive import archive_closed_orders, delete_orphaned_items
+
+
+class Command(BaseCommand):
+    help = 'Переносит отправленные и отменённые заказы старше срока хранения в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365,
+                            help='Срок хранения заказов в рабочих таблицах, дней')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, days, batch_size, **options):
+        archived = archive_closed_orders(days, batch_size=batch_size)
+        orphans = delete_orphaned_items(days, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'В архив перенесено заказов: {archived}, удалено элементов без заказа: {orphans}'
+        ))
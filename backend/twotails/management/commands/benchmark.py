@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from twotails.benchmarks import SCENARIOS
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Запускает нагрузочный сценарий на сгенерированных данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--size', type=int, default=None,
+                            help='Размер набора данных (по умолчанию свой у каждого сценария)')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не откатывать сгенерированные данные')
+
+    def handle(self, *args, scenario, size, keep, **options):
+        func = SCENARIOS[scenario]
+        size = size or func.default_size
+        if not func.rollback:
+            func(self.stdout, size)
+            return
+        try:
+            with transaction.atomic():
+                func(self.stdout, size)
+                if not keep:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Сгенерированные данные откачены')
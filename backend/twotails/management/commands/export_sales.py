@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from twotails.export import export_dir, export_sales
+
+
+class Command(BaseCommand):
+    help = 'Дописывает новые продажи в набор Parquet-файлов по месяцам для аналитики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Каталог набора (по умолчанию SALES_EXPORT_DIR)')
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, output, batch_size, **options):
+        rows, files = export_sales(output or export_dir(), batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Выгружено строк: {rows}, файлов: {len(files)}'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from twotails.partitioning import (
+    ARCHIVE_SCHEMA, PARTITIONED_TABLES, add_months, archive_partitions, ensure_partitions,
+    is_partitioned, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт помесячные секции заказов на будущее и отсоединяет '
+        'секции старше срока хранения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='На сколько месяцев вперёд создавать секции')
+        parser.add_argument('--retain', type=int, default=None,
+                            help='Сколько месяцев истории оставлять в рабочих таблицах')
+        parser.add_argument('--drop', action='store_true',
+                            help=f'Удалять старые секции вместо переноса в схему {ARCHIVE_SCHEMA}')
+
+    def handle(self, *args, ahead, retain, drop, **options):
+        if not all(is_partitioned(table) for table in PARTITIONED_TABLES):
+            raise CommandError('Таблицы заказов не секционированы (нужен PostgreSQL)')
+
+        this_month = month_start(timezone.now().date())
+        with transaction.atomic(), connection.cursor() as cursor:
+            for name in ensure_partitions(this_month, add_months(this_month, ahead), cursor):
+                self.stdout.write(f'Создана секция {name}')
+            if retain is not None:
+                before = add_months(this_month, -retain)
+                archived, skipped = archive_partitions(before, cursor, drop=drop)
+                for name in archived:
+                    self.stdout.write(f'{"Удалена" if drop else "Архивирована"} секция {name}')
+                for month in skipped:
+                    self.stdout.write(self.style.WARNING(
+                        f'Секции за {month:%Y-%m} не пусты и оставлены: '
+                        f'сначала перенесите заказы командой archive_orders'
+                    ))
+        self.stdout.write(self.style.SUCCESS('Готово'))
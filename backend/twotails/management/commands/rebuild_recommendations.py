@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from twotails.tasks import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает «часто покупают вместе» по строкам заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='За сколько последних дней брать заказы')
+        parser.add_argument('--top', type=int, default=10, help='Сколько соседей хранить для товара')
+        parser.add_argument('--min-orders', type=int, default=2,
+                            help='Минимум совместных заказов для пары')
+
+    def handle(self, *args, days, top, min_orders, **options):
+        stored = rebuild_recommendations(days=days, k=top, min_orders=min_orders)
+        self.stdout.write(self.style.SUCCESS(f'Сохранено пар: {stored}'))
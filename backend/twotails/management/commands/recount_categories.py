@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from twotails.categories import recount_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает количество товаров в категориях и их поддеревьях'
+
+    def handle(self, *args, **options):
+        updated = recount_all()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено категорий: {updated}'))
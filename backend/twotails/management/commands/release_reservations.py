@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from twotails.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие резервы товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, batch_size, **options):
+        released = release_expired(batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Снято резервов: {released}'))
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from twotails.promotions import products_for
+from twotails.repricing import RULE_CHOICES, InvalidRepricing, apply, preview, validate
+
+
+class Command(BaseCommand):
+    help = 'Массово пересчитывает цены продажи одним UPDATE (без --apply только предпросмотр)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rule', required=True, choices=[rule for rule, _ in RULE_CHOICES])
+        parser.add_argument('--value', required=True, type=Decimal)
+        parser.add_argument('--category', type=int, help='id категории (вместе с подкатегориями)')
+        parser.add_argument('--supplier', type=int, help='id поставщика')
+        parser.add_argument('--manufacturer')
+        parser.add_argument('--apply', action='store_true', help='Сохранить новые цены')
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in ('category', 'supplier', 'manufacturer')):
+            raise CommandError('Укажите --category, --supplier или --manufacturer')
+        try:
+            validate(options['rule'], options['value'])
+        except InvalidRepricing as error:
+            raise CommandError(str(error))
+        products = products_for(options['category'], options['supplier'], options['manufacturer'])
+        summary = preview(products, options['rule'], options['value'])
+        self.stdout.write(
+            f"Изменится товаров: {summary['changed']} из {summary['total']}, "
+            f"сумма цен {summary['old_sum']} → {summary['new_sum']}, "
+            f"изменение от {summary['min_delta']} до {summary['max_delta']}"
+        )
+        if summary['zeroed']:
+            raise CommandError(f"Правило обнулит цену товаров: {summary['zeroed']}")
+        if options['apply'] and summary['changed']:
+            try:
+                changed = apply(products, options['rule'], options['value'])
+            except InvalidRepricing as error:
+                raise CommandError(str(error))
+            self.stdout.write(self.style.SUCCESS(f'Цены пересчитаны: {len(changed)}'))
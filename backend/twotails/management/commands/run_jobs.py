@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from twotails.jobs import LANES, work
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lanes', default=','.join(LANES),
+                            help='Очереди через запятую: ' + ', '.join(LANES))
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--once', action='store_true',
+                            help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, lanes, batch_size, once, **options):
+        lanes = [lane for lane in lanes.split(',') if lane]
+        processed = work(lanes, batch_size=batch_size, stop_when_empty=once)
+        self.stdout.write(self.style.SUCCESS(f'Обработано задач: {processed}'))
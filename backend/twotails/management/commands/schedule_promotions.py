@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from twotails.promotions import schedule
+
+
+class Command(BaseCommand):
+    help = 'Включает и выключает акции по датам начала и окончания (запускать раз в сутки после полуночи)'
+
+    def handle(self, *args, **options):
+        activated, deactivated, products = schedule()
+        self.stdout.write(self.style.SUCCESS(
+            f'Включено акций: {len(activated)}, выключено: {len(deactivated)}, '
+            f'затронуто товаров: {len(products)}'
+        ))
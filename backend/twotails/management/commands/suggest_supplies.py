@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from twotails.forecasting import suggest_supplies
+
+
+class Command(BaseCommand):
+    help = 'Прогнозирует спрос и пересоздаёт черновики поставок по поставщикам'
+
+    def handle(self, *args, **options):
+        supplies = suggest_supplies()
+        items = sum(supply.items.count() for supply in supplies.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Черновиков поставок: {len(supplies)}, позиций: {items}'
+        ))
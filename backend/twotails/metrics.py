@@ -0,0 +1,189 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# Метрики копятся в памяти процесса и отдаются на /metrics в текстовом формате
+# Prometheus; каждый воркер отдаёт свои, суммирует их Prometheus.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Метка view для запросов к базе вне HTTP-запросов (задачи, команды).
+NO_VIEW = '-'
+
+_lock = threading.Lock()
+_request = ContextVar('metrics_request', default=None)
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name, self.documentation, self.labels = name, documentation, labels
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами; в памяти — счётчики по корзинам, не накопленные."""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labels = name, documentation, labels
+        self.buckets = tuple(buckets)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def observe(self, *labels, value):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        names = (*self.labels, 'le')
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(names, (*labels, bound))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {total}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+REQUESTS = Counter('http_requests_total', 'HTTP-запросы по представлению, методу и статусу',
+                   ('view', 'method', 'status'))
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                            ('view', 'method'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'Число SQL-запросов на один HTTP-запрос',
+                            ('view',), COUNT_BUCKETS)
+QUERIES = Counter('db_queries_total', 'SQL-запросы по базе и представлению', ('alias', 'view'))
+QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Время выполнения SQL-запроса',
+                          ('alias', 'view'), QUERY_BUCKETS)
+CACHE_LOOKUPS = Counter('cache_lookups_total', 'Чтения двухуровневого кэша: local, shared или miss',
+                        ('result',))
+
+
+def render():
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    __slots__ = ('request', 'resolved', 'queries')
+
+    def __init__(self, request):
+        self.request, self.resolved, self.queries = request, None, 0
+
+    @property
+    def view(self):
+        # Имя представления известно только после разбора URL; запросы
+        # middleware до этого момента попадают в '<unresolved>'.
+        if self.resolved is None:
+            match = self.request.resolver_match
+            if match is None:
+                return '<unresolved>'
+            self.resolved = match.view_name or match._func_path
+        return self.resolved
+
+
+def current_stats():
+    """Счётчики текущего HTTP-запроса или None вне запроса."""
+    return _request.get()
+
+
+def observe_query(execute, sql, params, many, context):
+    """execute_wrapper для всех соединений (ставится в signals.install_query_metrics)."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        stats = _request.get()
+        view = stats.view if stats is not None else NO_VIEW
+        if stats is not None:
+            stats.queries += 1
+        alias = context['connection'].alias
+        QUERIES.inc(alias, view)
+        QUERY_LATENCY.observe(alias, view, value=duration)
+
+
+def cache_lookups(result, amount=1):
+    if amount:
+        CACHE_LOOKUPS.inc(result, amount=amount)
+
+
+class MetricsMiddleware:
+    """Время, статус и число SQL-запросов каждого HTTP-запроса по имени представления.
+
+    Ставится первым в MIDDLEWARE, чтобы учитывать и работу остальных middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self.start(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, stats, started)
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        stats, token, started = self.start(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, stats, started)
+            _request.reset(token)
+
+    def start(self, request):
+        # Изменяемый объект, а не значение: sync_to_async копирует контекст,
+        # и запросы из потоков должны попасть в тот же счётчик.
+        stats = RequestStats(request)
+        return stats, _request.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, started):
+        duration = time.perf_counter() - started
+        status = response.status_code if response is not None else 500
+        REQUESTS.inc(stats.view, request.method, status)
+        REQUEST_LATENCY.observe(stats.view, request.method, value=duration)
+        REQUEST_QUERIES.observe(stats.view, value=stats.queries)
@@ -0,0 +1,134 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+from twotails.partitioning import PARTITIONED_TABLES, add_months, ensure_partitions
+
+PARTITIONS_AHEAD = 3
+
+
+def copy_order_dates(apps, schema_editor):
+    OrderItem = apps.get_model("twotails", "OrderItem")
+    Order = apps.get_model("twotails", "Order")
+    OrderItem.objects.filter(order__isnull=False).update(
+        order_created_at=models.Subquery(
+            Order.objects.filter(pk=models.OuterRef("order_id")).values("created_at")[
+                :1
+            ]
+        )
+    )
+
+
+def rebuild_table(cursor, table, partition_key):
+    """Пересоздаёт таблицу (секционированной, если задан partition_key) с теми же данными."""
+    legacy = f"{table}_legacy"
+    cursor.execute(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary",
+        [table],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{table}_pkey"')
+    for name, _ in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{name}"')
+    for name, _ in indexes:
+        cursor.execute(f'DROP INDEX "{name}"')
+
+    partitioning = f' PARTITION BY RANGE ("{partition_key}")' if partition_key else ""
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS '
+        f"INCLUDING IDENTITY INCLUDING CONSTRAINTS){partitioning}"
+    )
+    # Первичный ключ секционированной таблицы обязан включать ключ секционирования.
+    pk = f'"id", "{partition_key}"' if partition_key else '"id"'
+    cursor.execute(
+        f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ({pk})'
+    )
+    for _, definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+    if partition_key:
+        cursor.execute(f'SELECT MIN("{partition_key}") FROM "{legacy}"')
+        first = cursor.fetchone()[0]
+        today = timezone.now().date()
+        ensure_partitions(
+            first.date() if first else today,
+            add_months(today, PARTITIONS_AHEAD),
+            cursor,
+            [table],
+        )
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+        f'COALESCE(MAX("id"), 1), MAX("id") IS NOT NULL) FROM "{table}"'
+    )
+    cursor.execute(f'DROP TABLE "{legacy}"')
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, key in PARTITIONED_TABLES.items():
+            rebuild_table(cursor, table, key)
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            rebuild_table(cursor, table, None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0005_alter_product_sale_price_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="order_created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                editable=False,
+                verbose_name="Дата заказа",
+            ),
+        ),
+        migrations.RunPython(copy_order_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="order",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="twotails.order",
+                verbose_name="Заказ",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "created_at"], name="order_status_created_idx"
+            ),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0006_partition_orders"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                (
+                    "id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(verbose_name="Создан")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("created", "Создан"),
+                            ("paid", "Оплачен"),
+                            ("shipped", "Отправлен"),
+                            ("cancelled", "Отменён"),
+                        ],
+                        max_length=9,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("total_amount", models.FloatField(verbose_name="Общая сумма")),
+                (
+                    "items",
+                    models.JSONField(default=list, verbose_name="Элементы заказа"),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Перенесён в архив",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Архивный заказ",
+                "verbose_name_plural": "Архивные заказы",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-created_at"], name="archived_order_user_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:06
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0008_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "txid",
+                    models.BigIntegerField(
+                        db_default=models.Func(function="txid_current"),
+                        verbose_name="Транзакция",
+                    ),
+                ),
+                ("topic", models.CharField(max_length=30, verbose_name="Тема")),
+                ("object_id", models.BigIntegerField(verbose_name="ID объекта")),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("created", "Создан"),
+                            ("updated", "Изменён"),
+                            ("deleted", "Удалён"),
+                        ],
+                        max_length=7,
+                        verbose_name="Действие",
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        verbose_name="Данные",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Создано"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Событие изменения",
+                "verbose_name_plural": "События изменений",
+                "indexes": [
+                    models.Index(fields=["txid", "id"], name="change_event_cursor_idx")
+                ],
+            },
+        ),
+    ]
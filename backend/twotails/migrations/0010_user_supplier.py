@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0009_changeevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="supplier",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="users",
+                to="twotails.supplier",
+                verbose_name="Поставщик",
+            ),
+        ),
+    ]
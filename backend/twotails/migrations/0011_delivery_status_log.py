@@ -0,0 +1,98 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0010_user_supplier"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="delivery",
+            name="status_changed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Статус изменён"
+            ),
+        ),
+        migrations.CreateModel(
+            name="DeliveryStatusLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "from_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает подтверждения"),
+                            ("confirmed", "Подтверждена"),
+                            ("rejected", "Отклонена"),
+                            ("assembling", "Сборка"),
+                            ("in_progress", "В пути"),
+                            ("received", "Исполнена"),
+                            ("canceled", "Отменена"),
+                        ],
+                        max_length=11,
+                        verbose_name="Прежний статус",
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает подтверждения"),
+                            ("confirmed", "Подтверждена"),
+                            ("rejected", "Отклонена"),
+                            ("assembling", "Сборка"),
+                            ("in_progress", "В пути"),
+                            ("received", "Исполнена"),
+                            ("canceled", "Отменена"),
+                        ],
+                        max_length=11,
+                        verbose_name="Новый статус",
+                    ),
+                ),
+                (
+                    "changed_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Изменён"
+                    ),
+                ),
+                (
+                    "changed_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                (
+                    "delivery",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_log",
+                        to="twotails.delivery",
+                        verbose_name="Доставка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Смена статуса доставки",
+                "verbose_name_plural": "История статусов доставок",
+            },
+        ),
+    ]
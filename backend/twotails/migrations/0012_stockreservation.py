@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0011_delivery_status_log"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(verbose_name="Количество")),
+                ("expires_at", models.DateTimeField(verbose_name="Действует до")),
+                (
+                    "cart_item",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservation",
+                        to="twotails.cartitem",
+                        verbose_name="Элемент корзины",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="twotails.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Резерв товара",
+                "verbose_name_plural": "Резервы товаров",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "expires_at"],
+                        include=("quantity",),
+                        name="reservation_live_idx",
+                    ),
+                    models.Index(fields=["expires_at"], name="reservation_expiry_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:18
+
+from django.db import migrations, models
+
+from twotails.categories import recount_all
+
+
+def recount(apps, schema_editor):
+    recount_all()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0012_stockreservation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="direct_product_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Товаров в категории"
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="product_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Товаров с подкатегориями"
+            ),
+        ),
+        migrations.RunPython(recount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0013_category_product_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductNeighbour",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "orders",
+                    models.PositiveIntegerField(verbose_name="Совместных заказов"),
+                ),
+                ("score", models.FloatField(verbose_name="Сила связи")),
+                (
+                    "neighbour",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="twotails.product",
+                        verbose_name="Сосед",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="neighbours",
+                        to="twotails.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Совместная покупка",
+                "verbose_name_plural": "Совместные покупки",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "-score"],
+                        include=("neighbour",),
+                        name="product_neighbour_top_idx",
+                    )
+                ],
+            },
+        ),
+    ]
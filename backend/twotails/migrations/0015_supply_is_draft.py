@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0014_productneighbour"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="supply",
+            name="is_draft",
+            field=models.BooleanField(default=False, verbose_name="Черновик"),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0015_supply_is_draft"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sale_price",
+                    models.PositiveIntegerField(verbose_name="Цена продажи"),
+                ),
+                ("purchase_price", models.IntegerField(verbose_name="Закупочная цена")),
+                (
+                    "discount_percent",
+                    models.PositiveIntegerField(verbose_name="Процент скидки"),
+                ),
+                ("valid_from", models.DateTimeField(verbose_name="Действует с")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="price_history",
+                        to="twotails.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "История цен",
+                "verbose_name_plural": "История цен",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "valid_from"],
+                        include=("sale_price", "purchase_price", "discount_percent"),
+                        name="price_history_asof_idx",
+                    )
+                ],
+            },
+        ),
+        # Цены до появления истории неизвестны: считаем текущие действовавшими всегда.
+        migrations.RunSQL(
+            "INSERT INTO twotails_pricehistory "
+            "(product_id, sale_price, purchase_price, discount_percent, valid_from) "
+            "SELECT id, sale_price, purchase_price, discount_percent, '1970-01-01T00:00:00Z' "
+            "FROM twotails_product",
+            migrations.RunSQL.noop,
+        ),
+    ]
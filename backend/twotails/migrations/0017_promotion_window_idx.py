@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0016_pricehistory"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="promotion",
+            index=models.Index(
+                fields=["end_date", "start_date"], name="promotion_window_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0017_promotion_window_idx"),
+    ]
+
+    operations = [
+        # Дубли, которые мог оставить инлайн без ограничения: оставляем самую раннюю связь.
+        migrations.RunSQL(
+            "DELETE FROM twotails_productpromotion a USING twotails_productpromotion b "
+            "WHERE a.product_id = b.product_id AND a.promotion_id = b.promotion_id AND a.id > b.id",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="productpromotion",
+            constraint=models.UniqueConstraint(
+                fields=("product", "promotion"), name="product_promotion_unique"
+            ),
+        ),
+    ]
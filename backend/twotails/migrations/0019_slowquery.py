@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0018_productpromotion_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Записан"
+                    ),
+                ),
+                ("duration_ms", models.FloatField(verbose_name="Длительность, мс")),
+                ("alias", models.CharField(max_length=50, verbose_name="База")),
+                (
+                    "view",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Представление"
+                    ),
+                ),
+                (
+                    "origin",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Источник"
+                    ),
+                ),
+                ("sql", models.TextField(verbose_name="SQL")),
+                ("params", models.TextField(blank=True, verbose_name="Параметры")),
+                ("stack", models.TextField(blank=True, verbose_name="Стек вызовов")),
+                (
+                    "plan",
+                    models.TextField(blank=True, verbose_name="План EXPLAIN ANALYZE"),
+                ),
+            ],
+            options={
+                "verbose_name": "Медленный запрос",
+                "verbose_name_plural": "Медленные запросы",
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def create_default_role(apps, schema_editor):
+    # Роль по умолчанию для User.role: без неё нельзя создать пользователя
+    # (и на чистой базе, например тестовой, не проходят проверки auth).
+    apps.get_model('twotails', 'Role').objects.get_or_create(name='user')
+
+
+class Migration(migrations.Migration):
+
+    # Относится к резервам корзин (0012), а не к журналу медленных запросов:
+    # зависит только от 0012, чтобы применяться и откатываться вместе с ним.
+    dependencies = [
+        ("twotails", "0012_stockreservation"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_role, migrations.RunPython.noop),
+    ]
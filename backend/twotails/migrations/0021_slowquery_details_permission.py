@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0019_slowquery"),
+        ("twotails", "0020_default_role"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="slowquery",
+            options={
+                "permissions": [
+                    (
+                        "view_query_details",
+                        "Может видеть параметры и планы медленных запросов",
+                    )
+                ],
+                "verbose_name": "Медленный запрос",
+                "verbose_name_plural": "Медленные запросы",
+            },
+        ),
+    ]
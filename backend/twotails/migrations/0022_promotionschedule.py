@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("twotails", "0021_slowquery_details_permission"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PromotionSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scheduled_through", models.DateField(verbose_name="Обработано по")),
+            ],
+            options={
+                "verbose_name": "Планировщик акций",
+                "verbose_name_plural": "Планировщик акций",
+            },
+        ),
+    ]
@@ -1,9 +1,41 @@
-from django.db import models
+import json
+
+from django.db import connection, models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from datetime import timedelta
 
 
+class ChangeFeedMixin:
+    # Каждое сохранение пишет событие в ChangeEvent в той же транзакции.
+    # Удаления записываются сигналом post_delete (см. twotails/signals.py).
+    change_fields = ()
+
+    def save(self, *args, **kwargs):
+        action = 'created' if self._state.adding else 'updated'
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeEvent.record(self, action)
+
+    def change_data(self):
+        return {field: getattr(self, field) for field in self.change_fields}
+
+
+class LoadedFieldsMixin:
+    # Запоминает значения loaded_fields на момент загрузки, чтобы сигналы
+    # могли отличить перенос в другую категорию от обычного сохранения.
+    loaded_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = {field: instance.__dict__[field]
+                            for field in cls.loaded_fields if field in instance.__dict__}
+        return instance
+
+
 class Role(models.Model):
     name = models.CharField("Название роли", max_length=20, unique=True)
 
@@ -15,6 +47,7 @@ class User(AbstractUser):
     def get_default_role():
         return Role.objects.get(name='user')
     role = models.ForeignKey(Role, verbose_name="Роль", on_delete=models.SET_DEFAULT, default=get_default_role)
+    supplier = models.ForeignKey('Supplier', verbose_name="Поставщик", on_delete=models.SET_NULL, null=True, blank=True, related_name='users')
 
     class Meta:
         verbose_name = "Пользователь"
@@ -57,6 +90,9 @@ class Supplier(models.Model):
 class Supply(models.Model):
     supplier = models.ForeignKey(Supplier, verbose_name="Поставщик", on_delete=models.CASCADE, related_name="supplies")
     date = models.DateField("Дата поставки", auto_now_add=True)
+    # Черновик предлагает прогноз спроса (twotails/forecasting.py); остатки
+    # меняются только после проведения (twotails/supplies.py).
+    is_draft = models.BooleanField("Черновик", default=False)
 
     class Meta:
         verbose_name = "Поставка"
@@ -72,10 +108,13 @@ class SupplyItem(models.Model):
         verbose_name_plural = "Элементы поставки"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.product.last_delivery_quantity = self.quantity
-        self.product.current_quantity += self.quantity
-        self.product.save()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.supply.is_draft:
+                return
+            self.product.last_delivery_quantity = self.quantity
+            self.product.current_quantity += self.quantity
+            self.product.save()
 
 class Delivery(models.Model):
     STATUS_CHOICES = [
@@ -88,6 +127,7 @@ class Delivery(models.Model):
         ('canceled', 'Отменена'),
     ]
     status = models.CharField("Статус", max_length=11, choices=STATUS_CHOICES, default='pending')
+    status_changed_at = models.DateTimeField("Статус изменён", null=True, blank=True)
     delivery_date = models.DateTimeField("Дата и время доставки", auto_now_add=True)
     supplier = models.ForeignKey(Supplier, verbose_name="Поставщик",null=True, on_delete=models.SET_NULL)
 
@@ -95,15 +135,31 @@ class Delivery(models.Model):
         verbose_name = "Доставка"
         verbose_name_plural = "Доставки"
 
-class Category(models.Model):
+class DeliveryStatusLog(models.Model):
+    delivery = models.ForeignKey(Delivery, verbose_name="Доставка", on_delete=models.CASCADE, related_name='status_log')
+    from_status = models.CharField("Прежний статус", max_length=11, choices=Delivery.STATUS_CHOICES)
+    to_status = models.CharField("Новый статус", max_length=11, choices=Delivery.STATUS_CHOICES)
+    changed_at = models.DateTimeField("Изменён", default=timezone.now)
+    changed_by = models.ForeignKey(User, verbose_name="Пользователь", on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Смена статуса доставки"
+        verbose_name_plural = "История статусов доставок"
+
+class Category(LoadedFieldsMixin, models.Model):
     name = models.CharField("Название категории", max_length=25)
     parent = models.ForeignKey('self', verbose_name="Родительская категория", on_delete=models.SET_NULL, null=True, blank=True, related_name='subcategories')
+    # Поддерживаются сигналами (см. twotails/categories.py), пересчёт — recount_categories.
+    direct_product_count = models.PositiveIntegerField("Товаров в категории", default=0, editable=False)
+    product_count = models.PositiveIntegerField("Товаров с подкатегориями", default=0, editable=False)
+
+    loaded_fields = ('parent_id',)
 
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
 
-class Product(models.Model):
+class Product(ChangeFeedMixin, LoadedFieldsMixin, models.Model):
     name = models.CharField("Название товара", max_length=120)
     description = models.TextField("Описание")
     manufactured_by = models.DateField("Дата изготовления", default=timezone.now)
@@ -119,6 +175,11 @@ class Product(models.Model):
     has_discount = models.BooleanField("Скидка", default=False)
     discount_percent = models.PositiveIntegerField("Процент скидки", default=0)
 
+    change_fields = ('name', 'category_id', 'supplier_id', 'current_quantity', 'sale_price',
+                     'has_discount', 'discount_percent')
+    loaded_fields = ('category_id', 'sale_price', 'purchase_price', 'discount_percent')
+    price_fields = ('sale_price', 'purchase_price', 'discount_percent')
+
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
@@ -177,6 +238,41 @@ class CartItem(models.Model):
         verbose_name = "Элемент корзины"
         verbose_name_plural = "Элементы корзины"
 
+    def clean(self):
+        from .reservations import live_reservations
+
+        if self.product_id is None or self.quantity is None:
+            return
+        reserved = (live_reservations().filter(product_id=self.product_id).exclude(cart_item=self.pk)
+                    .aggregate(total=models.Sum('quantity'))['total'] or 0)
+        available = self.product.current_quantity - reserved
+        if self.quantity > available:
+            raise ValidationError({'quantity': f'Доступно только {available}'})
+
+    def save(self, *args, **kwargs):
+        from .reservations import reserve
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.cart.status == 'active':
+                reserve(self)
+
+class StockReservation(models.Model):
+    # Резерв товара под элемент активной корзины; истёкшие резервы не учитываются
+    # в доступном остатке и удаляются `manage.py release_reservations`.
+    cart_item = models.OneToOneField(CartItem, verbose_name="Элемент корзины", on_delete=models.CASCADE, related_name='reservation')
+    product = models.ForeignKey(Product, verbose_name="Товар", on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField("Количество")
+    expires_at = models.DateTimeField("Действует до")
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], include=['quantity'], name='reservation_live_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
 class Order(models.Model):
     user = models.ForeignKey(User, verbose_name="Пользователь", on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField("Создан", default=timezone.now)
@@ -192,9 +288,15 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, verbose_name="Заказ", on_delete=models.SET_NULL, null=True)
+    # Таблица заказов секционирована по created_at, поэтому внешний ключ
+    # на уровне БД невозможен (см. twotails/partitioning.py).
+    order = models.ForeignKey(Order, verbose_name="Заказ", on_delete=models.SET_NULL, null=True, db_constraint=False)
+    order_created_at = models.DateTimeField("Дата заказа", default=timezone.now, editable=False)
     product = models.ForeignKey(Product, verbose_name="Товар", on_delete=models.SET_NULL, null=True)
     quantity = models.PositiveIntegerField("Количество")
     price_at_purchase = models.FloatField("Цена на момент покупки")
@@ -203,7 +305,12 @@ class OrderItem(models.Model):
         verbose_name = "Элемент заказа"
         verbose_name_plural = "Элементы заказа"
 
-class Promotion(models.Model):
+    def save(self, *args, **kwargs):
+        if self.order_id:
+            self.order_created_at = self.order.created_at
+        super().save(*args, **kwargs)
+
+class Promotion(ChangeFeedMixin, models.Model):
     name = models.CharField("Название акции", max_length=50)
     description = models.TextField("Описание")
     discount_percent = models.PositiveIntegerField("Процент скидки")
@@ -211,15 +318,228 @@ class Promotion(models.Model):
     end_date = models.DateField("Дата окончания")
     is_active = models.BooleanField("Активна")
 
+    change_fields = ('name', 'discount_percent', 'start_date', 'end_date', 'is_active')
+
     class Meta:
         verbose_name = "Акция"
         verbose_name_plural = "Акции"
+        indexes = [
+            # Акции на дату D: end_date >= D отсекает закончившиеся, которых большинство.
+            models.Index(fields=['end_date', 'start_date'], name='promotion_window_idx'),
+        ]
     
 
-class ProductPromotion(models.Model):
+class PromotionSchedule(models.Model):
+    # Единственная строка: по какую дату планировщик акций уже отработал
+    # (см. promotions.schedule). Хранится в БД, а не в кэше, который могут вытеснить.
+    scheduled_through = models.DateField("Обработано по")
+
+    class Meta:
+        verbose_name = "Планировщик акций"
+        verbose_name_plural = "Планировщик акций"
+
+
+class ProductPromotion(ChangeFeedMixin, models.Model):
     product = models.ForeignKey(Product, verbose_name="Товар", on_delete=models.CASCADE)
     promotion = models.ForeignKey(Promotion, verbose_name="Акция", on_delete=models.CASCADE)
 
+    change_fields = ('product_id', 'promotion_id')
+
     class Meta:
         verbose_name = "Товар-акция"
         verbose_name_plural = "Товары-акции"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'promotion'], name='product_promotion_unique'),
+        ]
+
+
+class PriceHistory(models.Model):
+    # Только добавление: строка на каждое изменение цен товара (twotails/pricing.py).
+    # Цены действуют с valid_from до valid_from следующей строки этого товара.
+    product = models.ForeignKey(Product, verbose_name="Товар", on_delete=models.CASCADE, related_name='price_history', db_index=False)
+    sale_price = models.PositiveIntegerField("Цена продажи")
+    purchase_price = models.IntegerField("Закупочная цена")
+    discount_percent = models.PositiveIntegerField("Процент скидки")
+    valid_from = models.DateTimeField("Действует с")
+
+    class Meta:
+        verbose_name = "История цен"
+        verbose_name_plural = "История цен"
+        indexes = [
+            models.Index(fields=['product', 'valid_from'],
+                         include=['sale_price', 'purchase_price', 'discount_percent'],
+                         name='price_history_asof_idx'),
+        ]
+
+    @classmethod
+    def record(cls, product_ids):
+        """Снимок текущих цен товаров одним INSERT ... SELECT (и для массовых UPDATE)."""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            # clock_timestamp(), а не now(): несколько изменений в одной
+            # транзакции должны получить разные valid_from.
+            cursor.execute(
+                f'INSERT INTO {qn(cls._meta.db_table)} '
+                f'(product_id, sale_price, purchase_price, discount_percent, valid_from) '
+                f'SELECT p.id, p.sale_price, p.purchase_price, p.discount_percent, clock_timestamp() '
+                f'FROM {qn(Product._meta.db_table)} p JOIN unnest(%s::bigint[]) AS changed(id) ON p.id = changed.id',
+                [product_ids],
+            )
+            return cursor.rowcount
+
+
+class ProductNeighbour(models.Model):
+    # «Часто покупают вместе»: top-K соседей товара по совместным покупкам,
+    # пересчитывается целиком задачей recommendations.rebuild (twotails/recommendations.py).
+    # Индекс по product не нужен: его покрывает product_neighbour_top_idx.
+    product = models.ForeignKey(Product, verbose_name="Товар", on_delete=models.CASCADE, related_name='neighbours', db_index=False)
+    neighbour = models.ForeignKey(Product, verbose_name="Сосед", on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField("Совместных заказов")
+    score = models.FloatField("Сила связи")
+
+    class Meta:
+        verbose_name = "Совместная покупка"
+        verbose_name_plural = "Совместные покупки"
+        indexes = [
+            models.Index(fields=['product', '-score'], include=['neighbour'], name='product_neighbour_top_idx'),
+        ]
+
+
+class ArchivedOrder(models.Model):
+    # Закрытый заказ, перенесённый из рабочих таблиц (см. twotails/archive.py).
+    # id совпадает с id исходного заказа.
+    id = models.BigIntegerField("ID", primary_key=True)
+    user = models.ForeignKey(User, verbose_name="Пользователь", on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField("Создан")
+    status = models.CharField("Статус", max_length=9, choices=Order.STATUS_CHOICES)
+    total_amount = models.FloatField("Общая сумма")
+    # Элементы заказа в виде [product_id, quantity, price_at_purchase]
+    items = models.JSONField("Элементы заказа", default=list)
+    archived_at = models.DateTimeField("Перенесён в архив", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архивные заказы"
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_order_user_idx'),
+        ]
+
+    def item_objects(self):
+        return [
+            OrderItem(order_created_at=self.created_at, product_id=product_id,
+                      quantity=quantity, price_at_purchase=price)
+            for product_id, quantity, price in self.items
+        ]
+
+
+class Job(models.Model):
+    # Отложенная задача для воркеров `manage.py run_jobs` (см. twotails/jobs.py).
+    PRIORITY_CHOICES = [
+        (0, 'Высокий'),
+        (5, 'Обычный'),
+        (9, 'Низкий'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+    name = models.CharField("Задача", max_length=100)
+    payload = models.JSONField("Параметры", default=dict)
+    priority = models.PositiveSmallIntegerField("Приоритет", choices=PRIORITY_CHOICES, default=5)
+    status = models.CharField("Статус", max_length=7, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    max_attempts = models.PositiveSmallIntegerField("Максимум попыток", default=5)
+    run_at = models.DateTimeField("Запустить не раньше", default=timezone.now)
+    locked_at = models.DateTimeField("Взята в работу", null=True, blank=True)
+    finished_at = models.DateTimeField("Завершена", null=True, blank=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created_at = models.DateTimeField("Создана", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            models.Index(fields=['priority', 'run_at'], name='job_queued_idx',
+                         condition=models.Q(status='queued')),
+            models.Index(fields=['locked_at'], name='job_running_idx',
+                         condition=models.Q(status='running')),
+        ]
+
+
+class ChangeEvent(models.Model):
+    # Транзакционный outbox для потребителей изменений каталога (см. twotails/outbox.py).
+    # txid — номер транзакции, записавшей событие: читатель отдаёт только события
+    # завершённых транзакций, чтобы курсор не перепрыгнул через незакоммиченные.
+    ACTION_CHOICES = [
+        ('created', 'Создан'),
+        ('updated', 'Изменён'),
+        ('deleted', 'Удалён'),
+    ]
+    txid = models.BigIntegerField("Транзакция", db_default=models.Func(function='txid_current'))
+    topic = models.CharField("Тема", max_length=30)
+    object_id = models.BigIntegerField("ID объекта")
+    action = models.CharField("Действие", max_length=7, choices=ACTION_CHOICES)
+    data = models.JSONField("Данные", default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField("Создано", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Событие изменения"
+        verbose_name_plural = "События изменений"
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='change_event_cursor_idx'),
+        ]
+
+    @classmethod
+    def record(cls, instance, action):
+        data = instance.change_data() if action != 'deleted' else {}
+        return cls.objects.create(
+            topic=instance._meta.model_name, object_id=instance.pk, action=action, data=data,
+        )
+
+    @classmethod
+    def record_many(cls, model, ids, action='updated', data=None):
+        # Для массовых UPDATE, минующих save(): одно событие на каждый объект,
+        # вставленные одним INSERT ... SELECT unnest(...). data — общий словарь
+        # для всех событий или список словарей в порядке ids.
+        ids = list(ids)
+        if not ids:
+            return 0
+        rows = data if isinstance(data, list) else [data or {}] * len(ids)
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(cls._meta.db_table)} (topic, object_id, action, data, created_at) '
+                f'SELECT %s, event.id, %s, event.data, %s FROM unnest(%s::bigint[], %s::jsonb[]) AS event(id, data)',
+                [model._meta.model_name, action, timezone.now(), ids,
+                 [json.dumps(row, cls=DjangoJSONEncoder) for row in rows]],
+            )
+            return cursor.rowcount
+
+
+class SlowQuery(models.Model):
+    # SQL-запрос дольше SLOW_QUERY_MS (см. twotails/slow_queries.py); хранятся
+    # только последние SLOW_QUERY_KEEP записей.
+    created_at = models.DateTimeField("Записан", default=timezone.now)
+    duration_ms = models.FloatField("Длительность, мс")
+    alias = models.CharField("База", max_length=50)
+    view = models.CharField("Представление", max_length=200, blank=True)
+    origin = models.CharField("Источник", max_length=200, blank=True)
+    sql = models.TextField("SQL")
+    params = models.TextField("Параметры", blank=True)
+    stack = models.TextField("Стек вызовов", blank=True)
+    plan = models.TextField("План EXPLAIN ANALYZE", blank=True)
+
+    class Meta:
+        verbose_name = "Медленный запрос"
+        verbose_name_plural = "Медленные запросы"
+        permissions = [
+            ('view_query_details', 'Может видеть параметры и планы медленных запросов'),
+        ]
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f} мс: {self.sql[:80]}"
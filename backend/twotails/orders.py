@@ -0,0 +1,30 @@
+from django.db import transaction
+
+from .models import ChangeEvent, Order, OrderItem
+from .transitions import InvalidTransition, add_stock, conditional_update
+
+# Допустимые переходы: новый статус -> статусы, из которых в него можно попасть.
+TRANSITIONS = {
+    'paid': ('created',),
+    'shipped': ('paid',),
+    'cancelled': ('created', 'paid'),
+}
+
+
+def transition(queryset, target):
+    """Переводит заказы из queryset в статус target; возвращает id переведённых.
+
+    Для каждого перехода пишется событие в ChangeEvent (тема order); товары
+    отменённых заказов возвращаются на склад одним агрегированным UPDATE.
+    """
+    if target not in TRANSITIONS:
+        raise InvalidTransition(f'Недопустимый статус: {target}')
+    moved = []
+    with transaction.atomic():
+        for source in TRANSITIONS[target]:
+            ids = conditional_update(queryset, source, {'status': target})
+            moved.extend(ids)
+            ChangeEvent.record_many(Order, ids, data={'from': source, 'status': target})
+        if target == 'cancelled' and moved:
+            add_stock(OrderItem, 'order', moved)
+    return moved
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import ChangeEvent
+
+# Темы, которые видны в ленте только с правом на просмотр объекта:
+# заказы покупателей не должны попадать к потребителям каталога.
+RESTRICTED_TOPICS = {'order': 'twotails.view_order'}
+
+# Все транзакции с номером меньше xmin текущего снимка уже завершены.
+COMMITTED = RawSQL('txid_snapshot_xmin(txid_current_snapshot())', [])
+
+
+def parse_cursor(cursor):
+    if not cursor:
+        return 0, 0
+    txid, event_id = cursor.split('-')
+    return int(txid), int(event_id)
+
+
+def format_cursor(event):
+    return f'{event.txid}-{event.id}'
+
+
+def read_changes(cursor=None, limit=500, topics=None, hidden_topics=()):
+    """Возвращает события после курсора и новый курсор."""
+    txid, event_id = parse_cursor(cursor)
+    events = ChangeEvent.objects.filter(
+        Q(txid__gt=txid) | Q(txid=txid, id__gt=event_id), txid__lt=COMMITTED,
+    )
+    if topics:
+        events = events.filter(topic__in=topics)
+    if hidden_topics:
+        events = events.exclude(topic__in=hidden_topics)
+    events = list(events.order_by('txid', 'id')[:limit])
+    return events, format_cursor(events[-1]) if events else cursor
+
+
+async def wait_for_changes(cursor=None, limit=500, topics=None, hidden_topics=(), timeout=25, interval=0.5):
+    """Long-poll: ждёт событий до timeout секунд.
+
+    Поток освобождается только под ASGI; под WSGI async-представление идёт
+    через async_to_sync и держит воркер всё ожидание.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        events, next_cursor = await sync_to_async(read_changes)(cursor, limit, topics, hidden_topics)
+        if events or time.monotonic() >= deadline:
+            return events, next_cursor
+        await asyncio.sleep(interval)
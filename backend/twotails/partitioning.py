@@ -0,0 +1,146 @@
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+# Таблицы, разбитые на помесячные секции, и их ключ секционирования.
+# Элементы заказа хранят копию даты заказа, чтобы лежать в той же секции.
+PARTITIONED_TABLES = {
+    'twotails_order': 'created_at',
+    'twotails_orderitem': 'order_created_at',
+}
+ARCHIVE_SCHEMA = 'archive'
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def _bound(month):
+    return "'%s'" % datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc).isoformat()
+
+
+def is_partitioned(table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s)",
+            [table],
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(table, cursor):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = %s ORDER BY c.relname",
+        [table],
+    )
+    months = {}
+    prefix = f'{table}_p'
+    for (name,) in cursor.fetchall():
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('_')
+            months[date(int(year), int(month), 1)] = name
+    return months
+
+
+def create_default_partition(table, cursor):
+    qn = connection.ops.quote_name
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {qn(default_partition_name(table))} '
+        f'PARTITION OF {qn(table)} DEFAULT'
+    )
+
+
+def create_partition(table, month, cursor):
+    """Создаёт секцию за месяц, перенося попавшие в секцию DEFAULT строки."""
+    qn = connection.ops.quote_name
+    key = qn(PARTITIONED_TABLES[table])
+    name = partition_name(table, month)
+    default = qn(default_partition_name(table))
+    low, high = _bound(month), _bound(add_months(month, 1))
+    in_range = f'{key} >= {low} AND {key} < {high}'
+
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})')
+    if not cursor.fetchone()[0]:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(table)} '
+            f'FOR VALUES FROM ({low}) TO ({high})'
+        )
+        return name
+
+    # Новая секция пересекается со строками в DEFAULT: PostgreSQL не даст
+    # её создать, пока эти строки не будут перенесены.
+    with transaction.atomic():
+        cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {default}')
+        cursor.execute(
+            f'CREATE TABLE {qn(name)} PARTITION OF {qn(table)} '
+            f'FOR VALUES FROM ({low}) TO ({high})'
+        )
+        cursor.execute(f'INSERT INTO {qn(name)} SELECT * FROM {default} WHERE {in_range}')
+        cursor.execute(f'DELETE FROM {default} WHERE {in_range}')
+        cursor.execute(f'ALTER TABLE {qn(table)} ATTACH PARTITION {default} DEFAULT')
+    return name
+
+
+def ensure_partitions(start, end, cursor, tables=PARTITIONED_TABLES):
+    """Создаёт недостающие секции заказов и их элементов за месяцы [start, end]."""
+    created = []
+    for table in tables:
+        create_default_partition(table, cursor)
+        existing = list_partitions(table, cursor)
+        month = month_start(start)
+        while month <= end:
+            if month not in existing:
+                created.append(create_partition(table, month, cursor))
+            month = add_months(month, 1)
+    return created
+
+
+def archive_partitions(before, cursor, drop=False):
+    """Отсоединяет секции старше месяца ``before`` и переносит их в схему архива.
+
+    Отсоединяются только пустые месяцы: заказы из них должен сначала перенести
+    в ArchivedOrder archive_closed_orders, иначе они пропадут из истории
+    покупателей. Возвращает отсоединённые секции и пропущенные месяцы.
+    """
+    qn = connection.ops.quote_name
+    old = {table: {month: name for month, name in list_partitions(table, cursor).items() if month < before}
+           for table in PARTITIONED_TABLES}
+    skipped = set()
+    for partitions in old.values():
+        for month, name in partitions.items():
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {qn(name)})')
+            if cursor.fetchone()[0]:
+                skipped.add(month)
+    archived = []
+    if not drop:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {qn(ARCHIVE_SCHEMA)}')
+    for table, partitions in old.items():
+        for month, name in partitions.items():
+            if month in skipped:
+                continue
+            cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {qn(name)}')
+            else:
+                cursor.execute(f'ALTER TABLE {qn(name)} SET SCHEMA {qn(ARCHIVE_SCHEMA)}')
+            archived.append(name)
+    return archived, sorted(skipped)
@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class AccessScope:
+    role: str
+    supplier_id: int | None
+    permissions: frozenset
+
+    @property
+    def is_supplier(self):
+        return self.supplier_id is not None
+
+    def has(self, codename):
+        return f'twotails.{codename}' in self.permissions
+
+
+def get_scope(request):
+    """Роль, поставщик и права пользователя, вычисленные один раз за запрос."""
+    scope = getattr(request, '_access_scope', None)
+    if scope is None:
+        user = request.user
+        if user.is_superuser or not user.is_authenticated:
+            scope = AccessScope(role='', supplier_id=None, permissions=frozenset())
+        else:
+            scope = AccessScope(
+                role=user.role.name,
+                supplier_id=user.supplier_id,
+                permissions=frozenset(user.get_all_permissions()),
+            )
+        request._access_scope = scope
+    return scope
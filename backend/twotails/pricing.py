@@ -0,0 +1,54 @@
+from django.db import connection
+
+from .models import Order, OrderItem, PriceHistory
+
+PRICE_COLUMNS = ('sale_price', 'purchase_price', 'discount_percent')
+
+
+def prices_as_of(product_ids, at):
+    """Цены товаров на момент at: {product_id: {sale_price, purchase_price, discount_percent}}.
+
+    Один запрос: для каждого id — один спуск по индексу (product, valid_from).
+    У товаров без истории на этот момент значение None.
+    """
+    history = connection.ops.quote_name(PriceHistory._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT q.id, h.sale_price, h.purchase_price, h.discount_percent'
+            f' FROM unnest(%s::bigint[]) AS q(id)'
+            f' LEFT JOIN LATERAL (SELECT sale_price, purchase_price, discount_percent FROM {history}'
+            f'   WHERE product_id = q.id AND valid_from <= %s'
+            f'   ORDER BY valid_from DESC LIMIT 1) h ON true',
+            [list(product_ids), at],
+        )
+        return {row[0]: dict(zip(PRICE_COLUMNS, row[1:])) if row[1] is not None else None
+                for row in cursor.fetchall()}
+
+
+def margin_report(since, until):
+    """Выручка и себестоимость по товарам за период по закупочной цене на момент заказа.
+
+    Строки без истории цен (удалённые товары, загрузка в обход save()) входят
+    в выручку, но себестоимость и маржа товара тогда неизвестны (None).
+    """
+    qn = connection.ops.quote_name
+    history, order, item = (qn(model._meta.db_table) for model in (PriceHistory, Order, OrderItem))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT i.product_id, SUM(i.quantity) AS quantity,'
+            f'  SUM(i.quantity * i.price_at_purchase) AS revenue,'
+            f'  CASE WHEN COUNT(h.purchase_price) = COUNT(*) THEN SUM(i.quantity * h.purchase_price) END AS cost'
+            f' FROM {item} i'
+            f' JOIN {order} o ON o.id = i.order_id AND o.created_at = i.order_created_at'
+            f' LEFT JOIN LATERAL (SELECT purchase_price FROM {history}'
+            f'   WHERE product_id = i.product_id AND valid_from <= i.order_created_at'
+            f'   ORDER BY valid_from DESC LIMIT 1) h ON true'
+            f" WHERE i.order_created_at >= %s AND i.order_created_at < %s AND o.status <> 'cancelled'"
+            f' GROUP BY i.product_id',
+            [since, until],
+        )
+        return [
+            {'product': product_id, 'quantity': quantity, 'revenue': revenue, 'cost': cost,
+             'margin': revenue - cost if cost is not None else None}
+            for product_id, quantity, revenue, cost in cursor.fetchall()
+        ]
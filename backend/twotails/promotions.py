@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_versions
+from .categories import subtree_ids
+from .models import ChangeEvent, Product, ProductPromotion, Promotion, PromotionSchedule
+
+
+def window(day):
+    return Q(start_date__lte=day, end_date__gte=day)
+
+
+def active_on(day=None, queryset=None):
+    """Акции, действующие в день day (по умолчанию сегодня), по индексу promotion_window_idx.
+
+    Нужны и окно дат, и is_active: снятый вручную флаг досрочно завершает
+    акцию, а окно защищает от флага, который планировщик ещё не снял.
+    """
+    queryset = Promotion.objects.all() if queryset is None else queryset
+    return queryset.filter(window(day or timezone.localdate()), is_active=True)
+
+
+def set_active(queryset, value):
+    """UPDATE is_active для строк queryset; возвращает id изменённых строк."""
+    qn = connection.ops.quote_name
+    subquery, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {qn(Promotion._meta.db_table)} SET is_active = %s '
+            f'WHERE id IN ({subquery}) RETURNING id',
+            [value, *params],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def schedule(today=None):
+    """Включает акции, чьё окно открылось после прошлого запуска, и выключает закончившиеся.
+
+    Акцию, выключенную вручную посреди окна, планировщик снова не включит:
+    он трогает только окна, открывшиеся в (прошлый запуск, today].
+    """
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        # Блокировка строки заодно не даёт двум запускам пройти одновременно.
+        state = PromotionSchedule.objects.select_for_update().first()
+        if state is None:
+            state = PromotionSchedule(scheduled_through=today - timedelta(days=1))
+        last_run = state.scheduled_through
+        activated = set_active(
+            Promotion.objects.filter(window(today), start_date__gt=last_run, is_active=False), True,
+        )
+        deactivated = set_active(Promotion.objects.filter(end_date__lt=today, is_active=True), False)
+        changed = activated + deactivated
+        if today > last_run:
+            state.scheduled_through = today
+            state.save()
+        if not changed:
+            return activated, deactivated, []
+        ChangeEvent.record_many(Promotion, activated, data={'is_active': True})
+        ChangeEvent.record_many(Promotion, deactivated, data={'is_active': False})
+        product_ids = list(
+            ProductPromotion.objects.filter(promotion_id__in=changed)
+            .values_list('product_id', flat=True).distinct()
+        )
+
+        def invalidate():
+            from .bootstrap import bump_fragment
+
+            bump_versions('product', product_ids)
+            bump_fragment('promotions')
+
+        transaction.on_commit(invalidate)
+    return activated, deactivated, product_ids
+
+
+def products_for(category=None, supplier=None, manufacturer=None):
+    """Товары поддерева категории, поставщика и/или производителя (условия через И)."""
+    products = Product.objects.all()
+    if category is not None:
+        products = products.filter(category_id__in=subtree_ids(getattr(category, 'pk', category)))
+    if supplier is not None:
+        products = products.filter(supplier=supplier)
+    if manufacturer:
+        products = products.filter(manufacturer=manufacturer)
+    return products
+
+
+def assign(promotion_ids, products):
+    """Привязывает товары к акциям одним INSERT ... SELECT; уже привязанные пропускаются.
+
+    Возвращает id затронутых товаров.
+    """
+    qn = connection.ops.quote_name
+    subquery, params = products.values('pk').query.sql_with_params()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(ProductPromotion._meta.db_table)} (product_id, promotion_id) '
+                f'SELECT product.pk, promotion.id FROM ({subquery}) AS product '
+                f'CROSS JOIN unnest(%s::bigint[]) AS promotion(id) '
+                f'ON CONFLICT (product_id, promotion_id) DO NOTHING RETURNING id, product_id, promotion_id',
+                [*params, list(promotion_ids)],
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            return []
+        # Те же данные, что пишет save() (ProductPromotion.change_fields).
+        ChangeEvent.record_many(
+            ProductPromotion, [row[0] for row in rows], action='created',
+            data=[{'product_id': product_id, 'promotion_id': promotion_id} for _, product_id, promotion_id in rows],
+        )
+        product_ids = list({row[1] for row in rows})
+
+        def invalidate():
+            from .bootstrap import bump_fragment
+
+            bump_versions('product', product_ids)
+            bump_fragment('promotions')
+
+        transaction.on_commit(invalidate)
+    return product_ids
@@ -0,0 +1,91 @@
+import numpy as np
+from django.db import connection, transaction
+from scipy import sparse
+
+from .models import OrderItem, ProductNeighbour
+
+FETCH_SIZE = 100_000
+INSERT_BATCH = 50_000
+
+
+def order_lines(since=None):
+    """Пары (order_id, product_id) всех строк заказов, прочитанные серверным курсором пачками."""
+    # product_id пуст у строк удалённых товаров (SET_NULL).
+    items = OrderItem.objects.filter(order_id__isnull=False, product_id__isnull=False)
+    if since is not None:
+        items = items.filter(order_created_at__gte=since)
+    sql, params = items.values_list('order_id', 'product_id').query.sql_with_params()
+    chunks = []
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(FETCH_SIZE):
+            chunks.append(np.array(rows, dtype=np.int64))
+    if not chunks:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    lines = np.concatenate(chunks)
+    return lines[:, 0], lines[:, 1]
+
+
+def cooccurrence(order_ids, product_ids):
+    """Разреженная матрица совместных покупок товаров и число заказов каждого товара."""
+    _, order_index = np.unique(order_ids, return_inverse=True)
+    products, product_index = np.unique(product_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(order_index), dtype=np.int32), (order_index, product_index)),
+        shape=(order_index.max() + 1, len(products)),
+    )
+    # Повторные строки одного товара в заказе считаются одной покупкой.
+    baskets.sum_duplicates()
+    baskets.data[:] = 1
+    # Заказы из одного товара пар не дают — отбрасываем до умножения.
+    baskets = baskets[np.diff(baskets.indptr) > 1]
+    popularity = np.asarray(baskets.sum(axis=0)).ravel()
+    pairs = (baskets.T @ baskets).tocsr()
+    pairs.setdiag(0)
+    pairs.eliminate_zeros()
+    return products, popularity, pairs
+
+
+def top_neighbours(products, popularity, pairs, k=10, min_orders=2):
+    """top-K соседей каждого товара по косинусной мере: совместные заказы / sqrt(n_i * n_j)."""
+    result = {'product': [], 'neighbour': [], 'orders': [], 'score': []}
+    for row in range(pairs.shape[0]):
+        start, end = pairs.indptr[row], pairs.indptr[row + 1]
+        columns, counts = pairs.indices[start:end], pairs.data[start:end]
+        keep = counts >= min_orders
+        columns, counts = columns[keep], counts[keep]
+        if not len(columns):
+            continue
+        scores = counts / np.sqrt(popularity[row] * popularity[columns])
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            columns, counts, scores = columns[best], counts[best], scores[best]
+        result['product'].append(np.full(len(columns), products[row]))
+        result['neighbour'].append(products[columns])
+        result['orders'].append(counts)
+        result['score'].append(scores)
+    if not result['product']:
+        return {name: np.empty(0) for name in result}
+    return {name: np.concatenate(parts) for name, parts in result.items()}
+
+
+def store(neighbours):
+    table = connection.ops.quote_name(ProductNeighbour._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+        for start in range(0, len(neighbours['product']), INSERT_BATCH):
+            batch = slice(start, start + INSERT_BATCH)
+            cursor.execute(
+                f'INSERT INTO {table} (product_id, neighbour_id, orders, score) '
+                f'SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::int[], %s::float8[])',
+                [neighbours[name][batch].tolist() for name in ('product', 'neighbour', 'orders', 'score')],
+            )
+    return len(neighbours['product'])
+
+
+def rebuild(since=None, k=10, min_orders=2):
+    order_ids, product_ids = order_lines(since)
+    if not len(order_ids):
+        return store({name: np.empty(0) for name in ('product', 'neighbour', 'orders', 'score')})
+    products, popularity, pairs = cooccurrence(order_ids, product_ids)
+    return store(top_neighbours(products, popularity, pairs, k=k, min_orders=min_orders))
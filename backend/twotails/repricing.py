@@ -0,0 +1,104 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Cast, Greatest, Round
+
+from .cache import bump_versions
+from .models import ChangeEvent, PriceHistory, Product
+
+RULE_CHOICES = [
+    ('percent', 'Цена продажи ± процент'),
+    ('absolute', 'Цена продажи ± сумма'),
+    ('markup', 'Наценка на закупочную цену, %'),
+]
+
+# Нижние границы значения (не включительно / включительно): ниже цены уходят в ноль
+# или под закупочную.
+PERCENT_MIN = Decimal(-100)
+MARKUP_MIN = Decimal(0)
+
+
+class InvalidRepricing(ValueError):
+    pass
+
+
+def validate(rule, value):
+    value = Decimal(value)
+    if rule not in dict(RULE_CHOICES):
+        raise InvalidRepricing(f'Неизвестное правило: {rule}')
+    if rule == 'percent' and value <= PERCENT_MIN:
+        raise InvalidRepricing('Процент должен быть больше -100')
+    if rule == 'markup' and value < MARKUP_MIN:
+        raise InvalidRepricing('Наценка не может быть отрицательной')
+    return value
+
+
+def new_price(rule, value):
+    """Выражение новой цены продажи; считается в самой базе, по F() от текущих цен."""
+    value = Decimal(value)
+    if rule == 'percent':
+        price = F('sale_price') * (1 + value / 100)
+    elif rule == 'absolute':
+        price = F('sale_price') + value
+    elif rule == 'markup':
+        price = F('purchase_price') * (1 + value / 100)
+    else:
+        raise ValueError(f'Неизвестное правило: {rule}')
+    return Greatest(Cast(Round(price), IntegerField()), Value(0))
+
+
+def _plain(queryset):
+    # Список товаров в админке с фильтром по m2m (акции) приходит с DISTINCT,
+    # а PostgreSQL не даёт брать FOR UPDATE с DISTINCT — отбираем по pk заново.
+    return Product.objects.filter(pk__in=queryset.values('pk'))
+
+
+def _changing(queryset, rule, value):
+    return queryset.alias(new_price=new_price(rule, value)).exclude(new_price=F('sale_price'))
+
+
+def preview(queryset, rule, value):
+    """Сколько товаров изменится и на сколько — одним агрегирующим запросом, без записи."""
+    delta = F('new_price') - F('sale_price')
+    return _plain(queryset).annotate(new_price=new_price(rule, value)).aggregate(
+        total=Count('pk'),
+        changed=Count('pk', filter=~Q(new_price=F('sale_price'))),
+        old_sum=Sum('sale_price'),
+        new_sum=Sum('new_price'),
+        min_delta=Min(delta),
+        max_delta=Max(delta),
+        zeroed=Count('pk', filter=Q(new_price=0) & ~Q(sale_price=0)),
+    )
+
+
+def apply(queryset, rule, value):
+    """Пересчитывает цены одним UPDATE и пишет историю цен и события пачкой.
+
+    Возвращает id изменённых товаров. Правило, обнуляющее хоть одну цену,
+    отклоняется целиком (InvalidRepricing).
+    """
+    value = validate(rule, value)
+    with transaction.atomic():
+        ids = list(_changing(_plain(queryset), rule, value).select_for_update(of=('self',))
+                   .values_list('pk', flat=True))
+        if not ids:
+            return []
+        zeroed = Product.objects.filter(pk__in=ids).alias(new_price=new_price(rule, value)).filter(new_price=0)
+        if zeroed.exists():
+            raise InvalidRepricing(f'Правило обнулит цену товаров: {zeroed.count()}')
+        Product.objects.filter(pk__in=ids).update(sale_price=new_price(rule, value))
+        PriceHistory.record(ids)
+        # Те же данные, что пишет save() (Product.change_fields), уже с новыми ценами.
+        rows = {row.pop('pk'): row
+                for row in Product.objects.filter(pk__in=ids).values('pk', *Product.change_fields)}
+        ChangeEvent.record_many(Product, ids, data=[rows[pk] for pk in ids])
+
+        def invalidate():
+            from .bootstrap import bump_fragment
+
+            bump_versions('product', ids)
+            bump_fragment('products')
+
+        transaction.on_commit(invalidate)
+    return ids
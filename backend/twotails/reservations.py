@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, available):
+        super().__init__(f'Недостаточно товара «{product.name}»: доступно {available}')
+        self.product = product
+        self.available = available
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+
+
+def live_reservations(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def with_available(queryset):
+    """Аннотирует товары доступным остатком: current_quantity минус живые резервы."""
+    reserved = (live_reservations().filter(product=OuterRef('pk'))
+                .values('product').annotate(total=Sum('quantity')).values('total'))
+    return queryset.annotate(
+        reserved_quantity=Coalesce(Subquery(reserved), 0),
+        available_quantity=F('current_quantity') - F('reserved_quantity'),
+    )
+
+
+def reserve(cart_item):
+    """Создаёт или продлевает резерв под элемент корзины либо бросает InsufficientStock."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Блокировка строки товара держится только до конца этой транзакции,
+        # а не всё оформление заказа.
+        product = Product.objects.select_for_update().get(pk=cart_item.product_id)
+        reserved = (live_reservations(now).filter(product=product)
+                    .exclude(cart_item=cart_item).aggregate(total=Sum('quantity'))['total'] or 0)
+        available = product.current_quantity - reserved
+        if cart_item.quantity > available:
+            raise InsufficientStock(product, available)
+        StockReservation.objects.update_or_create(
+            cart_item=cart_item,
+            defaults={'product': product, 'quantity': cart_item.quantity,
+                      'expires_at': now + reservation_ttl()},
+        )
+
+
+def extend(carts):
+    """Продлевает ещё не истёкшие резервы корзин (queryset); истёкшие нужно резервировать заново."""
+    now = timezone.now()
+    return live_reservations(now).filter(cart_item__cart__in=carts).update(
+        expires_at=now + reservation_ttl(),
+    )
+
+
+def release_expired(batch_size=5000):
+    table = connection.ops.quote_name(StockReservation._meta.db_table)
+    released = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'  SELECT id FROM {table} WHERE expires_at <= %s'
+                f'  LIMIT %s FOR UPDATE SKIP LOCKED)',
+                [timezone.now(), batch_size],
+            )
+            if not cursor.rowcount:
+                return released
+            released += cursor.rowcount
@@ -0,0 +1,129 @@
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# Модели каталога и отчётов, которые можно читать с реплик.
+# Корзины, заказы и пользователи всегда читаются с основной базы.
+REPLICA_MODELS = {
+    'category', 'product', 'promotion', 'productpromotion', 'supplier',
+    'supply', 'supplyitem', 'delivery', 'deliveryitem', 'archivedorder',
+}
+PRIMARY_COOKIE = 'pin_primary'
+
+_pinned_until = ContextVar('pinned_until', default=0.0)
+_wrote = ContextVar('wrote', default=False)
+_replica_health = {}
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def pin_primary(seconds=None):
+    _pinned_until.set(time.monotonic() + (sticky_seconds() if seconds is None else seconds))
+
+
+def is_pinned():
+    return time.monotonic() < _pinned_until.get()
+
+
+def replica_lag(alias):
+    # Реплика, воспроизведшая всё полученное, не отстаёт, даже если основная база
+    # давно ничего не писала и время последней транзакции старое. На основной
+    # базе (или на её локальной копии) все эти функции возвращают NULL.
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+            " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_is_healthy(alias):
+    checked_at, healthy = _replica_health.get(alias, (0.0, True))
+    now = time.monotonic()
+    if now - checked_at < getattr(settings, 'REPLICA_CHECK_INTERVAL', 5):
+        return healthy
+    try:
+        healthy = replica_lag(alias) <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+    except DatabaseError:
+        healthy = False
+    _replica_health[alias] = (now, healthy)
+    return healthy
+
+
+class ReplicaRouter:
+    """Читает каталог с реплик, пока запрос не записал что-то в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'twotails' or model._meta.model_name not in REPLICA_MODELS:
+            return None
+        if is_pinned():
+            return 'default'
+        replicas = [alias for alias in getattr(settings, 'REPLICA_DATABASES', [])
+                    if replica_is_healthy(alias)]
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'twotails':
+            pin_primary()
+            _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему через репликацию.
+        return db == 'default'
+
+
+class ReplicaStickinessMiddleware:
+    """Переносит привязку к основной базе на следующие запросы через cookie."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self.start(request)
+        try:
+            return self.finish(self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    async def __acall__(self, request):
+        tokens = self.start(request)
+        try:
+            return self.finish(await self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    def start(self, request):
+        tokens = _pinned_until.set(0.0), _wrote.set(False)
+        if PRIMARY_COOKIE in request.COOKIES:
+            pin_primary()
+        return tokens
+
+    def finish(self, response):
+        # sync_to_async переносит изменения контекстных переменных обратно,
+        # поэтому запись из async ORM здесь тоже видна.
+        if _wrote.get():
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=sticky_seconds(),
+                                httponly=True, samesite='Lax')
+        return response
+
+    def reset(self, tokens):
+        pinned_token, wrote_token = tokens
+        _pinned_until.reset(pinned_token)
+        _wrote.reset(wrote_token)
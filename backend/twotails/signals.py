@@ -0,0 +1,118 @@
+from django.db import router, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .bootstrap import bump_fragment
+from .cache import bump_versions
+from .categories import adjust_counts, move_subtree, subtree_count
+from .metrics import observe_query
+from .models import Category, ChangeEvent, PriceHistory, Product, ProductPromotion, Promotion
+from .slow_queries import capture_slow
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_delete, sender=ProductPromotion)
+def record_deletion(sender, instance, **kwargs):
+    # Collector.delete() отправляет post_delete внутри своей транзакции.
+    ChangeEvent.record(instance, 'deleted')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_cache_version(sender, instance, **kwargs):
+    # После коммита, чтобы по новой версии не закэшировали ещё старые данные.
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: bump_versions(kind, [pk]))
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Category)
+def load_tracked_fields(sender, instance, raw, **kwargs):
+    # Экземпляр создан не через from_db или поле было отложено — дочитываем из базы.
+    loaded = instance.__dict__.setdefault('_loaded', {})
+    missing = [field for field in sender.loaded_fields if field not in loaded]
+    if raw or instance._state.adding or not missing:
+        return
+    manager = sender._base_manager.db_manager(router.db_for_write(sender, instance=instance))
+    loaded.update(manager.filter(pk=instance.pk).values(*missing).first() or {})
+
+
+@receiver(post_save, sender=Product)
+def count_product(sender, instance, created, raw, update_fields, **kwargs):
+    if raw or (update_fields is not None and not {'category', 'category_id'} & update_fields):
+        return
+    old = None if created else instance._loaded.get('category_id')
+    if old != instance.category_id:
+        adjust_counts(old, -1)
+        adjust_counts(instance.category_id, 1)
+        transaction.on_commit(lambda: bump_fragment('categories'))
+    instance._loaded['category_id'] = instance.category_id
+
+
+@receiver(post_save, sender=Product)
+def record_price_change(sender, instance, created, raw, update_fields, **kwargs):
+    fields = sender.price_fields
+    if raw or (update_fields is not None and not set(fields) & set(update_fields)):
+        return
+    if created or any(instance._loaded.get(field) != getattr(instance, field) for field in fields):
+        PriceHistory.record([instance.pk])
+    instance._loaded.update({field: getattr(instance, field) for field in fields})
+
+
+@receiver(post_delete, sender=Product)
+def uncount_product(sender, instance, **kwargs):
+    adjust_counts(getattr(instance, '_loaded', {}).get('category_id', instance.category_id), -1)
+    transaction.on_commit(lambda: bump_fragment('categories'))
+
+
+@receiver(post_save, sender=Category)
+def move_category(sender, instance, created, raw, update_fields, **kwargs):
+    if raw or created or (update_fields is not None and not {'parent', 'parent_id'} & update_fields):
+        return
+    old = instance._loaded.get('parent_id')
+    if old != instance.parent_id:
+        move_subtree(instance.pk, old, instance.parent_id)
+    instance._loaded['parent_id'] = instance.parent_id
+
+
+@receiver(pre_delete, sender=Category)
+def detach_category(sender, instance, **kwargs):
+    # Подкатегории станут корнями (SET_NULL), товары останутся без категории:
+    # предки теряют всё поддерево удаляемой категории.
+    parent_id = (Category._base_manager.db_manager(router.db_for_write(sender, instance=instance))
+                 .filter(pk=instance.pk).values_list('parent_id', flat=True).first())
+    adjust_counts(parent_id, -subtree_count(instance.pk), direct=False)
+
+
+BOOTSTRAP_FRAGMENTS = {Category: 'categories', Product: 'products',
+                       Promotion: 'promotions', ProductPromotion: 'promotions'}
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_save, sender=ProductPromotion)
+@receiver(post_delete, sender=ProductPromotion)
+def bump_bootstrap(sender, **kwargs):
+    fragment = BOOTSTRAP_FRAGMENTS[sender]
+    transaction.on_commit(lambda: bump_fragment(fragment))
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # Обёртка живёт в объекте соединения, а сигнал приходит при каждом переподключении.
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+@receiver(connection_created)
+def install_slow_query_capture(sender, connection, **kwargs):
+    if capture_slow not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture_slow)
@@ -0,0 +1,154 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Запись и EXPLAIN выполняет фоновый поток со своими соединениями, чтобы не
+# задерживать запрос и не зависеть от его транзакции. Если очередь полна,
+# запись теряется.
+_queue = queue.Queue(maxsize=100)
+_worker = None
+_worker_lock = threading.Lock()
+_local = threading.local()
+STACK_DEPTH = 8
+# Обёртки execute сами в стеке не интересны.
+WRAPPER_FILES = (__file__, metrics.__file__)
+
+
+def option(name, default):
+    return getattr(settings, name, default)
+
+
+def stack_summary():
+    """Последние кадры стека из кода проекта (без Django и сторонних пакетов)."""
+    root = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(root) and 'site-packages' not in frame.filename
+        and frame.filename not in WRAPPER_FILES
+    ]
+    return '\n'.join(f'{os.path.relpath(frame.filename, root)}:{frame.lineno} в {frame.name}'
+                     for frame in frames[-STACK_DEPTH:])
+
+
+def origin(stats):
+    # Для страниц админки — класс ModelAdmin, для остальных — функция представления.
+    match = stats.request.resolver_match if stats is not None else None
+    if match is None:
+        return ''
+    model_admin = getattr(match.func, 'model_admin', None)
+    if model_admin is not None:
+        return type(model_admin).__qualname__
+    return match._func_path
+
+
+def explainable(sql, many):
+    # EXPLAIN ANALYZE выполняет запрос, поэтому только чтение без блокировок строк.
+    statement = sql.lstrip().upper()
+    return not many and statement.startswith('SELECT') and ' FOR UPDATE' not in statement \
+        and ' FOR SHARE' not in statement and ' FOR NO KEY UPDATE' not in statement
+
+
+def format_params(params):
+    # В параметрах бывают хэши паролей, данные сессий и адреса: по умолчанию
+    # храним только их число.
+    if option('SLOW_QUERY_STORE_PARAMS', False):
+        return repr(params)[:10000]
+    return f'скрыто: {len(params)}' if params else ''
+
+
+def capture_slow(execute, sql, params, many, context):
+    """execute_wrapper: запросы дольше SLOW_QUERY_MS уходят в журнал медленных запросов."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        threshold = option('SLOW_QUERY_MS', 500)
+        if threshold and duration_ms >= threshold and not getattr(_local, 'worker', False):
+            report(sql, params, many, context['connection'].alias, duration_ms)
+
+
+def report(sql, params, many, alias, duration_ms):
+    stats = metrics.current_stats()
+    view = stats.view if stats is not None else metrics.NO_VIEW
+    logger.warning('Медленный запрос %.0f мс (%s): %s', duration_ms, view, sql[:500])
+    explain = explainable(sql, many) and random.random() < option('SLOW_QUERY_EXPLAIN_RATE', 0.1)
+    entry = {
+        'created_at': timezone.now(),
+        'duration_ms': duration_ms,
+        'alias': alias,
+        'view': view[:200],
+        'origin': origin(stats)[:200],
+        'sql': sql,
+        'params': format_params(params),
+        'stack': stack_summary(),
+    }
+    try:
+        _queue.put_nowait((entry, params if explain else None, explain))
+    except queue.Full:
+        return
+    start_worker()
+
+
+def start_worker():
+    global _worker
+    # После fork поток родителя в дочернем процессе не жив — запускаем новый.
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=work, name='slow-queries', daemon=True)
+            _worker.start()
+
+
+def work():
+    _local.worker = True
+    while True:
+        entry, params, explain = _queue.get()
+        try:
+            if explain:
+                entry['plan'] = explain_plan(entry['alias'], entry['sql'], params)
+            store(entry)
+        except Exception:
+            logger.exception('Не удалось записать медленный запрос')
+            connections.close_all()
+        finally:
+            _queue.task_done()
+
+
+def explain_plan(alias, sql, params):
+    # Отдельное соединение не видит незакоммиченных данных исходной транзакции,
+    # поэтому план может отличаться; транзакция EXPLAIN всегда откатывается.
+    try:
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s', [option('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 30000)])
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            transaction.set_rollback(True, using=alias)
+            return plan
+    except DatabaseError as error:
+        return f'EXPLAIN не выполнен: {error}'
+
+
+def store(entry):
+    record = SlowQuery.objects.create(**entry)
+    # Журнал по кругу: храним только последние SLOW_QUERY_KEEP записей.
+    SlowQuery.objects.filter(pk__lte=record.pk - option('SLOW_QUERY_KEEP', 10000)).delete()
+
+
+def flush():
+    """Ждёт, пока фоновый поток запишет всё из очереди (для команд и замеров)."""
+    _queue.join()
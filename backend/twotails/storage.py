@@ -0,0 +1,63 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.xml', '.ico')
+# Файлы меньше этого размера не сжимаем: выигрыш меньше накладных расходов.
+MIN_SIZE = 512
+
+
+def compressors():
+    yield 'gz', lambda data: gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield 'br', lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest-хранилище, которое при collectstatic кладёт рядом .gz и .br версии."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = []
+        for name, hashed_name, done in super().post_process(paths, dry_run, **options):
+            processed.append(hashed_name if isinstance(hashed_name, str) else name)
+            yield name, hashed_name, done
+        if dry_run:
+            return
+        # Исходные имена тоже раздаются (например, index.html сборки Vite).
+        for name in {*paths, *processed}:
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE) or not self.exists(name):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_SIZE:
+            return
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            # Сжатая версия, которая не меньше исходной, только мешает.
+            if len(compressed) >= len(data):
+                continue
+            target = f'{name}.{suffix}'
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(compressed))
+            yield target
+
+
+def encoded_variants(path):
+    """Пути к сжатым версиям файла, которые реально лежат на диске."""
+    return {
+        encoding: f'{path}.{suffix}'
+        for encoding, suffix in (('br', 'br'), ('gzip', 'gz'))
+        if os.path.exists(f'{path}.{suffix}')
+    }
@@ -0,0 +1,15 @@
+from django.db import transaction
+
+from .models import Supply, SupplyItem
+from .transitions import add_stock
+
+
+def post_drafts(queryset):
+    """Проводит черновики поставок: снимает признак и приходует товары одним UPDATE."""
+    with transaction.atomic():
+        ids = list(queryset.filter(is_draft=True).select_for_update().values_list('pk', flat=True))
+        if not ids:
+            return []
+        Supply.objects.filter(pk__in=ids).update(is_draft=False)
+        add_stock(SupplyItem, 'supply', ids, record_last_delivery=True)
+    return ids
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .jobs import task
+
+# Задачи для воркеров `manage.py run_jobs`. Тяжёлые зависимости импортируются
+# внутри задач, чтобы не грузить их в каждый процесс веб-сервера.
+
+
+@task('recommendations.rebuild')
+def rebuild_recommendations(days=365, k=10, min_orders=2):
+    from .recommendations import rebuild
+
+    return rebuild(timezone.now() - timedelta(days=days), k=k, min_orders=min_orders)
+
+
+@task('forecast.suggest_supplies')
+def suggest_supplies():
+    from .forecasting import suggest_supplies
+
+    return len(suggest_supplies())
+
+
+@task('promotions.schedule')
+def schedule_promotions():
+    from .promotions import schedule
+
+    activated, deactivated, _ = schedule()
+    return len(activated) + len(deactivated)
@@ -1,3 +1,125 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
 
-# Create your tests here.
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from . import guest_cart
+from .models import Cart, CartItem, Product, Role, StockReservation, User
+from .reservations import InsufficientStock
+from .storage import CompressedManifestStaticFilesStorage
+
+
+class ReservationConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        Role.objects.get_or_create(name='user')
+
+    def test_parallel_carts_do_not_oversell(self):
+        product = Product.objects.create(
+            name='Корм', description='', purchase_price=100, sale_price=150,
+            current_quantity=10, manufacturer='Производитель',
+        )
+        carts = [
+            Cart.objects.create(
+                user=User.objects.create_user(f'buyer{i}', f'buyer{i}@example.com', 'x'),
+                status='active',
+            )
+            for i in range(30)
+        ]
+        barrier = threading.Barrier(len(carts))
+        results = []
+
+        def add_to_cart(cart):
+            try:
+                barrier.wait()
+                CartItem.objects.create(cart=cart, product=product, quantity=1)
+                results.append('reserved')
+            except InsufficientStock:
+                results.append('rejected')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add_to_cart, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reserved = StockReservation.objects.filter(product=product).aggregate(total=Sum('quantity'))['total']
+        self.assertLessEqual(reserved, product.current_quantity)
+        self.assertEqual(reserved, results.count('reserved'))
+        self.assertEqual(results.count('reserved'), 10)
+        self.assertEqual(results.count('rejected'), 20)
+        self.assertEqual(CartItem.objects.filter(product=product).count(), 10)
+
+
+class GuestCartMergeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'x')
+        self.product = Product.objects.create(
+            name='Корм', description='', purchase_price=100, sale_price=150,
+            current_quantity=10, manufacturer='Производитель',
+        )
+        self.client.force_login(self.user)
+
+    def set_guest_cart(self, items):
+        signer = signing.get_cookie_signer(salt=guest_cart.COOKIE_NAME + guest_cart.COOKIE_SALT)
+        self.client.cookies[guest_cart.COOKIE_NAME] = signer.sign(json.dumps(items))
+
+    def test_product_deleted_before_login(self):
+        gone = Product.objects.create(
+            name='Снят с продажи', description='', purchase_price=1, sale_price=2,
+            current_quantity=5, manufacturer='Производитель',
+        )
+        self.set_guest_cart({str(self.product.pk): 2, str(gone.pk): 1})
+        gone.delete()
+
+        response = self.client.get(reverse('cart'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[guest_cart.COOKIE_NAME].value, '')
+        items = CartItem.objects.filter(cart__user=self.user)
+        self.assertEqual(list(items.values_list('product_id', 'quantity')), [(self.product.pk, 2)])
+
+    def test_oversized_quantity_is_clamped(self):
+        self.product.current_quantity = 5000
+        self.product.save()
+        self.set_guest_cart({str(self.product.pk): 10 ** 12})
+
+        response = self.client.get(reverse('cart'))
+
+        self.assertEqual(response.status_code, 200)
+        item = CartItem.objects.get(cart__user=self.user)
+        self.assertEqual(item.quantity, guest_cart.MAX_QUANTITY)
+
+
+class StaticCompressionTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(STATIC_ROOT=root.name))
+        self.original = b'export const answer = 42;\n' * 200
+        storage = CompressedManifestStaticFilesStorage(location=root.name)
+        storage.save('app.js', ContentFile(self.original))
+        self.encodings = {'gz': 'gzip', 'br': 'br'}
+        self.variants = [self.encodings[name.rsplit('.', 1)[1]] for name in storage.compress('app.js')]
+
+    def test_compressed_variant_is_served_and_smaller(self):
+        for encoding in self.variants:
+            with self.subTest(encoding=encoding):
+                response = self.client.get('/static/app.js', HTTP_ACCEPT_ENCODING=encoding)
+                body = b''.join(response.streaming_content)
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertLess(len(body), len(self.original))
+                self.assertEqual(response['Content-Disposition'], 'inline; filename="app.js"')
+        self.assertIn('gzip', self.variants)
+
+    def test_identity_without_accept_encoding(self):
+        response = self.client.get('/static/app.js', HTTP_ACCEPT_ENCODING='')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), self.original)
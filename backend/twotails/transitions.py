@@ -0,0 +1,49 @@
+from django.db import connection, transaction
+
+from .cache import bump_versions
+from .models import ChangeEvent, Product
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def conditional_update(queryset, source, values):
+    """UPDATE строк queryset со статусом source; возвращает id изменённых строк.
+
+    Строки, которые успели сменить статус в параллельной транзакции, условию
+    status = source уже не удовлетворяют, поэтому статус не перескакивает.
+    """
+    qn = connection.ops.quote_name
+    subquery, params = queryset.values('pk').query.sql_with_params()
+    assignments = ', '.join(f'{qn(column)} = %s' for column in values)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {qn(queryset.model._meta.db_table)} SET {assignments} '
+            f'WHERE status = %s AND id IN ({subquery}) RETURNING id',
+            [*values.values(), source, *params],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def add_stock(item_model, parent_field, parent_ids, record_last_delivery=False):
+    """Прибавляет к остаткам товаров суммы количеств из элементов документов одним UPDATE."""
+    qn = connection.ops.quote_name
+    parent_column = item_model._meta.get_field(parent_field).column
+    last_delivery = ', last_delivery_quantity = moved.quantity' if record_last_delivery else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {qn(Product._meta.db_table)} AS p '
+            f'SET current_quantity = p.current_quantity + moved.quantity{last_delivery} '
+            f'FROM (SELECT item.product_id, SUM(item.quantity) AS quantity '
+            f'      FROM {qn(item_model._meta.db_table)} AS item '
+            f'      JOIN unnest(%s::bigint[]) AS parent(id) ON item.{qn(parent_column)} = parent.id '
+            f'      WHERE item.product_id IS NOT NULL '
+            f'      GROUP BY item.product_id) AS moved '
+            f'WHERE p.id = moved.product_id RETURNING p.id',
+            [list(parent_ids)],
+        )
+        product_ids = [row[0] for row in cursor.fetchall()]
+    ChangeEvent.record_many(Product, product_ids)
+    transaction.on_commit(lambda: bump_versions('product', product_ids))
+    return product_ids
@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('bootstrap/', views.bootstrap, name='bootstrap'),
+    path('changes/', views.changes, name='changes'),
+    path('cart/', views.cart, name='cart'),
+    path('products/', views.catalogue, name='catalogue'),
+    path('products/<int:product_id>/', views.product_detail, name='product-detail'),
+    path('products/<int:product_id>/recommendations/', views.product_recommendations,
+         name='product-recommendations'),
+    path('categories/<int:category_id>/facets/', views.category_facets, name='category-facets'),
+]
@@ -1,3 +1,292 @@
-from django.shortcuts import render
+import functools
+import hmac
+import json
+import math
+import mimetypes
+import os
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET, require_http_methods
+from django.views.static import was_modified_since
+
+from . import bootstrap as bootstrap_data
+from . import guest_cart, metrics as metrics_registry
+from .categories import subtree_ids
+from .facets import get_facets
+from .models import Cart, CartItem, Category, Product, ProductNeighbour
+from .outbox import RESTRICTED_TOPICS, wait_for_changes
+from .promotions import active_on
+from .reservations import InsufficientStock, extend, with_available
+from .storage import encoded_variants
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+CATALOGUE_PAGE_SIZE = 24
+# Предел ожидания /api/changes/: под WSGI long-poll держит воркер, поэтому короче.
+CHANGES_MAX_WAIT = 25
+CHANGES_MAX_WAIT_WSGI = 5
+CATALOGUE_FIELDS = ('id', 'name', 'sale_price', 'has_discount', 'discount_percent',
+                    'manufacturer', 'category_id')
+
+
+def has_bearer_token(request, token):
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+@require_GET
+def bootstrap(request):
+    payload = bootstrap_data.get_payload()
+    encoding = bootstrap_data.negotiate_encoding(
+        request.headers.get('Accept-Encoding', ''), payload['encoded'],
+    )
+    # У каждой кодировки своё тело, поэтому и свой сильный ETag.
+    etag = f'"{payload["etag"]}-{encoding}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(payload['encoded'][encoding], content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_GET
+async def changes(request):
+    # Лента изменений служебная: персоналу или по CHANGES_TOKEN.
+    user = await request.auser()
+    by_token = has_bearer_token(request, getattr(settings, 'CHANGES_TOKEN', ''))
+    if not user.is_staff and not by_token:
+        return JsonResponse({'error': 'Доступ запрещён'}, status=403)
+    hidden_topics = [] if by_token else [
+        topic for topic, permission in RESTRICTED_TOPICS.items() if not await user.ahas_perm(permission)
+    ]
+    max_wait = CHANGES_MAX_WAIT if isinstance(request, ASGIRequest) else CHANGES_MAX_WAIT_WSGI
+    try:
+        limit = int(request.GET.get('limit', 500))
+        wait = float(request.GET.get('wait', 0))
+        if not math.isfinite(wait) or wait < 0 or limit < 1:
+            raise ValueError
+        events, cursor = await wait_for_changes(
+            request.GET.get('after'),
+            limit=min(limit, 1000),
+            topics=request.GET.getlist('topic'),
+            hidden_topics=hidden_topics,
+            timeout=min(wait, max_wait),
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Некорректные параметры'}, status=400)
+    return JsonResponse({
+        'cursor': cursor,
+        'events': [
+            {
+                'topic': event.topic,
+                'id': event.object_id,
+                'action': event.action,
+                'data': event.data,
+                'at': event.created_at,
+            }
+            for event in events
+        ],
+    })
+
+
+async def _cart_items(request, user):
+    if user.is_authenticated:
+        return {
+            product_id: quantity
+            async for product_id, quantity in CartItem.objects
+            .filter(cart__user=user, cart__status='active').values_list('product_id', 'quantity')
+        }
+    return guest_cart.load(request)
+
+
+async def _cart_response(items):
+    products = {
+        product['id']: product
+        async for product in Product.objects.filter(pk__in=items).values('id', 'name', 'sale_price')
+    }
+    return JsonResponse({
+        'items': [
+            {'product': product_id, 'name': products[product_id]['name'],
+             'price': products[product_id]['sale_price'], 'quantity': quantity}
+            for product_id, quantity in items.items() if product_id in products
+        ],
+    })
+
+
+def _set_cart_item(user, product_id, quantity):
+    # Резервирование идёт в транзакции с блокировкой строки товара,
+    # а транзакции в async ORM недоступны — выполняем в потоке.
+    user_cart, _ = Cart.objects.get_or_create(user=user, status='active')
+    if quantity > 0:
+        CartItem.objects.update_or_create(
+            cart=user_cart, product_id=product_id, defaults={'quantity': quantity},
+        )
+    else:
+        CartItem.objects.filter(cart=user_cart, product_id=product_id).delete()
+
+
+@require_http_methods(['GET', 'POST'])
+async def cart(request):
+    user = await request.auser()
+    if user.is_authenticated:
+        # Пока покупатель работает с корзиной, её резервы не истекают.
+        await sync_to_async(extend)(Cart.objects.filter(user=user, status='active'))
+    if request.method == 'GET':
+        return await _cart_response(await _cart_items(request, user))
+
+    try:
+        data = json.loads(request.body)
+        product_id, quantity = int(data['product']), int(data['quantity'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Некорректные параметры'}, status=400)
+    if quantity > guest_cart.MAX_QUANTITY:
+        return JsonResponse(
+            {'error': f'Нельзя положить в корзину больше {guest_cart.MAX_QUANTITY} шт. одного товара'},
+            status=400,
+        )
+    if not await Product.objects.filter(pk=product_id).aexists():
+        return JsonResponse({'error': 'Товар не найден'}, status=404)
+
+    if not user.is_authenticated:
+        try:
+            items = guest_cart.set_quantity(guest_cart.load(request), product_id, quantity)
+        except ValueError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        response = await _cart_response(items)
+        guest_cart.store(response, items)
+        return response
+
+    try:
+        await sync_to_async(_set_cart_item)(user, product_id, quantity)
+    except InsufficientStock as error:
+        return JsonResponse({'error': str(error), 'available': error.available}, status=409)
+    return await _cart_response(await _cart_items(request, user))
+
+
+@require_GET
+async def catalogue(request):
+    products = Product.objects.order_by('name', 'id')
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        if 'category' in request.GET:
+            category_ids = await sync_to_async(subtree_ids)(int(request.GET['category']))
+            products = products.filter(category_id__in=category_ids)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректные параметры'}, status=400)
+    offset = (page - 1) * CATALOGUE_PAGE_SIZE
+    # Берём на одну запись больше, чтобы узнать о следующей странице без COUNT(*).
+    rows = [row async for row in products.values(*CATALOGUE_FIELDS)[offset:offset + CATALOGUE_PAGE_SIZE + 1]]
+    return JsonResponse({
+        'page': page,
+        'has_next': len(rows) > CATALOGUE_PAGE_SIZE,
+        'products': rows[:CATALOGUE_PAGE_SIZE],
+    })
+
+
+@require_GET
+async def product_detail(request, product_id):
+    try:
+        product = await with_available(
+            Product.objects.select_related('category', 'supplier'),
+        ).aget(pk=product_id)
+    except Product.DoesNotExist:
+        return JsonResponse({'error': 'Товар не найден'}, status=404)
+    return JsonResponse({
+        **{field: getattr(product, field) for field in CATALOGUE_FIELDS},
+        'description': product.description,
+        'available': max(product.available_quantity, 0),
+        'category': product.category and product.category.name,
+        'supplier': product.supplier and product.supplier.name,
+        'promotions': [
+            promotion async for promotion in active_on(queryset=product.promotions.all())
+            .values('id', 'name', 'discount_percent', 'end_date')
+        ],
+    })
+
+
+@require_GET
+async def product_recommendations(request, product_id):
+    # Соседи хранятся готовыми (twotails/recommendations.py): один проход по индексу.
+    neighbours = (ProductNeighbour.objects.filter(product_id=product_id)
+                  .select_related('neighbour').order_by('-score')[:10])
+    return JsonResponse({
+        'products': [
+            {'id': item.neighbour_id, 'name': item.neighbour.name,
+             'sale_price': item.neighbour.sale_price, 'score': round(item.score, 4)}
+            async for item in neighbours
+        ],
+    })
+
+
+@require_GET
+def category_facets(request, category_id):
+    if not Category.objects.filter(pk=category_id).exists():
+        return JsonResponse({'error': 'Категория не найдена'}, status=404)
+    try:
+        filters = {
+            'manufacturer': request.GET.getlist('manufacturer'),
+            'supplier': [int(value) for value in request.GET.getlist('supplier')],
+            'promotion': [int(value) for value in request.GET.getlist('promotion')],
+            'price': [int(value) for value in request.GET.getlist('price')],
+        }
+    except ValueError:
+        return JsonResponse({'error': 'Некорректные параметры'}, status=400)
+    return JsonResponse(get_facets(category_id, filters))
+
+
+@require_GET
+def metrics(request):
+    # Сборщик передаёт METRICS_TOKEN в Authorization: Bearer; без токена
+    # метрики открыты только при DEBUG.
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not has_bearer_token(request, token):
+        return HttpResponse(status=401)
+    if not token and not settings.DEBUG:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@functools.cache
+def hashed_static_names():
+    # Manifest читается хранилищем один раз при старте, поэтому и множество строим один раз.
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+@require_GET
+def static_asset(request, path):
+    """Раздаёт собранную статику, выбирая заранее сжатую версию по Accept-Encoding."""
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404(path)
+    if not os.path.isfile(fullpath):
+        raise Http404(path)
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        variants = encoded_variants(fullpath)
+        encoding = bootstrap_data.negotiate_encoding(request.headers.get('Accept-Encoding', ''), variants)
+        content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+        # Имя — исходного файла, иначе Content-Disposition назовёт его «….gz».
+        response = FileResponse(open(variants.get(encoding, fullpath), 'rb'), content_type=content_type,
+                                filename=os.path.basename(fullpath))
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+    # Имена из manifest и из assets/ сборки Vite содержат хэш содержимого.
+    if path in hashed_static_names() or path.startswith('assets/'):
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = 'public, no-cache'
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -5,7 +5,9 @@ import vue from '@vitejs/plugin-vue'
 import vueDevTools from 'vite-plugin-vue-devtools'
 
 // https://vite.dev/config/
-export default defineConfig({
+export default defineConfig(({ command }) => ({
+  // Собранные файлы раздаёт Django из STATIC_ROOT (collectstatic).
+  base: command === 'build' ? '/static/' : '/',
   plugins: [
     vue(),
     vueDevTools(),
@@ -16,4 +18,4 @@ export default defineConfig({
       '@': fileURLToPath(new URL('./src', import.meta.url))
     },
   },
-})
+}))